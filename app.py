@@ -1,20 +1,36 @@
 from flask import Flask, request, render_template, redirect, url_for, send_from_directory, jsonify, Response
 import os
+import time
 import subprocess
 from datetime import datetime
 import signal
 import psutil
-import json
 from werkzeug.utils import secure_filename
-from queue import Queue, Empty
-from threading import Lock
-from PIL import Image
+from queue import Queue, Full
+from threading import Lock, Thread
+from PIL import Image, ImageOps, features
 import io
 import hashlib
 from functools import lru_cache
+from collections import OrderedDict
 import random
 import argparse
 import sys
+from urllib.parse import quote
+import render_cache
+import display_control
+import image_catalog
+import state_store
+import upload_pipeline
+import content_store
+import event_broker
+from upload_pipeline import UploadError
+
+try:
+    import pillow_heif  # Optional: HEIF/HEIC uploads
+    pillow_heif.register_heif_opener()
+except ImportError:
+    pillow_heif = None
 
 app = Flask(__name__)
 UPLOAD_FOLDER = 'uploads'
@@ -26,180 +42,703 @@ SLIDESHOW_STATE_FILE = 'slideshow_state.json'
 SELECTED_IMAGES_FILE = 'selected_images.json'
 MAX_IMAGES = 49  # Maximum number of images allowed
 
+# Settings and state files, cached in memory and written in the background
+STATE = state_store.StateStore()
+
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Store the current slideshow process
 slideshow_process = None
+SLIDESHOW_STOP_TIMEOUT = 5  # Seconds the display gets to shut down before it is killed
 
-# Store SSE clients
-clients = []
-clients_lock = Lock()
+# SSE fan-out; state events keep only their latest value for slow clients
+EVENTS = event_broker.EventBroker(coalesce={
+    'selected_images': lambda data: None,
+    'slideshow_settings': lambda data: None,
+    'slideshow_state': lambda data: None,
+    'device_name': lambda data: None,
+    'processing': lambda data: data['filename'],
+    'image_moved': lambda data: None,  # Carries the whole order, so only the latest matters
+    'display_metrics': lambda data: None,
+})
+SSE_PING_INTERVAL = 20  # Seconds between keep-alive comments
+SSE_STREAM_LIFETIME = 300  # Seconds before a stream ends and the browser reconnects with Last-Event-ID
+SERVE_THREADS = event_broker.MAX_CLIENTS + 8  # Default --threads for --serve; each open stream holds one
+METRICS_INTERVAL = 5  # Seconds between display_metrics events while pages are open
+SERVE_SPARE_THREADS = 4  # Threads never taken by streams, so pages and uploads are still answered
 
+CACHE_FOLDER = 'cache'
+THUMBNAIL_FOLDER = os.path.join(CACHE_FOLDER, 'thumbnails')
 THUMBNAIL_SIZE = (512, 512)  # Increased from (150, 150)
-THUMBNAIL_CACHE = {}  # In-memory cache for thumbnails
+THUMBNAIL_WIDTHS = (160, 320, 512, 1024)  # Square bounding boxes offered to the grid's srcset
+THUMBNAIL_SIZES_ATTR = '(max-width: 767px) 50vw, 200px'  # Rendered width of a grid cell
+# Encodings in order of preference: (extension, mimetype, Pillow format, save options)
+THUMBNAIL_FORMATS = [
+    ('avif', 'image/avif', 'AVIF', {'quality': 60, 'speed': 8}),
+    ('webp', 'image/webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'image/jpeg', 'JPEG', {'quality': 85}),
+]
+THUMBNAIL_FORMATS = [f for f in THUMBNAIL_FORMATS if f[0] == 'jpg' or features.check(f[2].lower())]
+THUMBNAIL_MEMORY_LIMIT = 16 * 1024 * 1024  # Bytes of thumbnails kept in RAM
+THUMBNAIL_DISK_LIMIT = 128 * 1024 * 1024  # Bytes of thumbnails kept on disk
+RENDER_FOLDER = render_cache.RENDER_FOLDER
+DISPLAY_SIZE = (1920, 1080)  # Panel resolution used until display_image.py reports one
+PROCESSING_WORKERS = 2  # Background threads generating thumbnails and renders
+PROCESSING_QUEUE_SIZE = MAX_IMAGES
+ORIGINALS_FOLDER = 'originals'
+KEEP_ORIGINALS = False  # Keep the uploaded file when it is transcoded (--keep-originals)
+UPLOAD_JPEG_QUALITY = 90
+PASSTHROUGH_FORMATS = {'jpeg', 'png', 'gif', 'bmp'}  # Stored as uploaded when small enough
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # Seconds browsers keep content-versioned URLs
+SOURCE_HASHES_FILE = os.path.join(content_store.OBJECT_FOLDER, 'sources.json')  # Uploaded hash -> stored hash
+
+app.config['MAX_CONTENT_LENGTH'] = upload_pipeline.MAX_UPLOAD_BYTES + 1024 * 1024  # Form overhead
+
+os.makedirs(THUMBNAIL_FOLDER, exist_ok=True)
+os.makedirs(RENDER_FOLDER, exist_ok=True)
+os.makedirs(content_store.OBJECT_FOLDER, exist_ok=True)
+
+# Content hashes keyed by path, invalidated when size or mtime change
+content_hashes = {}
+content_hashes_lock = Lock()
+
+# Per-output locks so a request and a background job never generate the same file twice
+generation_locks = {}
+generation_locks_lock = Lock()
+
+# Uploads still arriving in chunks
+UPLOADS = upload_pipeline.UploadManager()
+# Held while a finished upload is checked against MAX_IMAGES, named and catalogued
+upload_commit_lock = Lock()
+
+# Upload post-processing: bounded job queue and the status of files still in it
+processing_queue = Queue(maxsize=PROCESSING_QUEUE_SIZE)
+processing_status = {}
+processing_lock = Lock()
+
+class ThumbnailCache:
+    """Bounded LRU of encoded thumbnails in front of the on-disk store"""
+
+    def __init__(self, folder, memory_limit, disk_limit):
+        self.folder = folder
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.entries = OrderedDict()
+        self.memory_bytes = 0
+        self.lock = Lock()
+
+    def path_for(self, key):
+        return os.path.join(self.folder, key)
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                return data
+
+        path = self.path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Mark as recently used for disk eviction
+        except OSError:
+            return None
+
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        path = self.path_for(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing thumbnail {key}: {e}")
+
+        self._remember(key, data)
+        self._evict_disk()
+
+    def discard(self, prefix):
+        """Drop every cached thumbnail whose key starts with prefix"""
+        with self.lock:
+            for key in [k for k in self.entries if k.startswith(prefix)]:
+                self.memory_bytes -= len(self.entries.pop(key))
+        try:
+            for name in os.listdir(self.folder):
+                if name.startswith(prefix):
+                    os.remove(self.path_for(name))
+        except OSError as e:
+            print(f"Error discarding thumbnails for {prefix}: {e}")
+
+    def _remember(self, key, data):
+        with self.lock:
+            if key in self.entries:
+                self.memory_bytes -= len(self.entries.pop(key))
+            self.entries[key] = data
+            self.memory_bytes += len(data)
+            while self.memory_bytes > self.memory_limit and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        try:
+            files = []
+            total = 0
+            for entry in os.scandir(self.folder):
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self.disk_limit:
+                return
+            # Oldest (least recently used) first
+            for _, size, path in sorted(files):
+                os.remove(path)
+                total -= size
+                if total <= self.disk_limit:
+                    break
+        except OSError as e:
+            print(f"Error evicting thumbnails: {e}")
+
+THUMBNAIL_CACHE = ThumbnailCache(THUMBNAIL_FOLDER, THUMBNAIL_MEMORY_LIMIT, THUMBNAIL_DISK_LIMIT)
+
+# Uploads metadata, loaded on first use so request handlers never list the folder
+IMAGE_CATALOG = image_catalog.ImageCatalog(
+    UPLOAD_FOLDER,
+    order_loader=lambda: load_image_order().get('order', []),
+    hash_lookup=render_cache.lookup_hash,
+    listener=lambda kind, version, data: publish_catalog_change(kind, version, data)
+)
 
 def notify_clients(event_type, data):
-    with clients_lock:
-        dead_clients = []
-        for client in clients:
-            try:
-                client.put({
-                    'event': event_type,
-                    'data': data
-                })
-            except:
-                dead_clients.append(client)
-        
-        # Remove dead clients
-        for client in dead_clients:
-            clients.remove(client)
+    EVENTS.publish(event_type, data)
 
 def load_image_order():
-    try:
-        if os.path.exists(ORDER_FILE):
-            with open(ORDER_FILE, 'r') as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"Error loading image order: {e}")
-    return {}
+    return STATE.load(ORDER_FILE, {})
 
 def save_image_order(order):
-    try:
-        with open(ORDER_FILE, 'w') as f:
-            json.dump(order, f)
-    except Exception as e:
-        print(f"Error saving image order: {e}")
+    STATE.save(ORDER_FILE, order)
 
 def stop_slideshow():
     global slideshow_process
     if slideshow_process:
         try:
-            slideshow_process.terminate()
-            slideshow_process.wait(timeout=1)
+            # Ask the display to quit so it restores the screen and removes its socket;
+            # if it is not listening, SIGTERM makes it do the same
+            if slideshow_process.poll() is None and not display_control.send_command('quit'):
+                slideshow_process.terminate()
+            slideshow_process.wait(timeout=SLIDESHOW_STOP_TIMEOUT)
         except:
             slideshow_process.kill()
         finally:
             slideshow_process = None
             save_slideshow_state(False)
 
+def start_slideshow_process(image_paths, settings):
+    """Spawn display_image.py listening on the control socket for later changes"""
+    global slideshow_process
+    slideshow_process = subprocess.Popen([
+        'python3',
+        'display_image.py',
+        ','.join(image_paths),
+        str(settings['delay']),
+        settings['transition'],
+        str(settings['transition_duration']),
+        '--control', display_control.CONTROL_SOCKET
+    ])
+    save_slideshow_state(True)
+
+def send_display_command(command, **args):
+    """Send a command to the running slideshow; returns the reply, or None if it is not running or failed"""
+    if not is_slideshow_running():
+        return None
+    reply = display_control.send_command(command, **args)
+    if reply and reply.get('ok'):
+        return reply
+    return None
+
+def sync_display_playlist():
+    """Push the selected images, in grid order, to a running slideshow
+
+    The display keeps the slides it has already decoded and switches to the
+    new list at its next slide change, so edits never restart it.
+    """
+    if not is_slideshow_running():
+        return
+    position = {name: i for i, name in enumerate(IMAGE_CATALOG.names())}
+    playlist = [name for name in load_selected_images() if name in position]
+    playlist.sort(key=position.get)
+    if not playlist:
+        return  # Keep showing the old list rather than going blank
+    warm_render_cache(playlist)
+    send_display_command('set_playlist', images=[os.path.join(UPLOAD_FOLDER, name) for name in playlist])
+
+def content_version(content_hash):
+    """Short hash used as the ?v= of content-versioned URLs"""
+    return content_hash[:16]
+
+def thumbnail_url(filename, content_hash=None, width=None):
+    """Thumbnail URL; versioned by content when the hash is known so browsers can keep it forever"""
+    params = []
+    if content_hash:
+        params.append(f"v={content_version(content_hash)}")
+    if width:
+        params.append(f"w={width}")
+    url = f"/thumbnail/{quote(filename)}"
+    return f"{url}?{'&'.join(params)}" if params else url
+
+def thumbnail_srcset(filename, content_hash=None):
+    return ', '.join(f"{thumbnail_url(filename, content_hash, w)} {w}w" for w in THUMBNAIL_WIDTHS)
+
+def cache_for(response, immutable):
+    """Cache headers for a validated response: forever for a matching ?v=, else revalidate each time"""
+    if immutable:
+        response.cache_control.no_cache = None  # send_file sets it on every file response
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+def image_info(entry):
+    """Image dict for the page, the snapshot endpoint and catalog events"""
+    return {
+        'name': entry['name'],
+        'thumbnail': thumbnail_url(entry['name'], entry['hash']),
+        'srcset': thumbnail_srcset(entry['name'], entry['hash']),
+        'upload_time': datetime.fromtimestamp(entry['ctime']).strftime('%Y-%m-%d %H:%M:%S'),
+        'processing': is_processing(entry['name']),
+        'size': entry['size'],
+        'width': entry['width'],
+        'height': entry['height'],
+    }
+
+def publish_catalog_change(kind, version, data):
+    """Send one catalog change to browsers as a versioned delta event"""
+    if kind == 'add':
+        notify_clients('image_added', {'version': version, 'image': image_info(data['entry']), 'position': data['position']})
+    elif kind == 'update':
+        notify_clients('image_updated', {'version': version, 'image': image_info(data['entry'])})
+    elif kind == 'remove':
+        notify_clients('image_removed', {'version': version, 'names': data['names']})
+    elif kind == 'move':
+        notify_clients('image_moved', {'version': version, 'order': data['order']})
+
+def prune_selection(removed):
+    """Drop removed images from the saved selection"""
+    selected = load_selected_images()
+    kept = [name for name in selected if name not in removed]
+    if len(kept) != len(selected) and save_selected_images(kept):
+        notify_clients('selected_images', {'selected': kept})
+
+def on_uploads_changed(added, removed):
+    """Catch up with files added or removed outside the app"""
+    for filename in removed:
+        forget_content_hash(os.path.join(UPLOAD_FOLDER, filename))
+    if removed:
+        render_cache.update_manifest(removed=removed)
+        # Their hashes are gone with the files, so sweep for objects nothing links to
+        in_use = {entry['hash'] for entry in IMAGE_CATALOG.images()}
+        for content_hash in content_store.unused(in_use):
+            release_content(content_hash)
+        prune_renders()
+    for filename in added:
+        forget_content_hash(os.path.join(UPLOAD_FOLDER, filename))
+        queue_processing(filename)
+    print(f"Uploads folder changed: {len(added)} added, {len(removed)} removed")
+    if removed:
+        prune_selection(set(removed))
+        sync_display_playlist()
+
 def load_device_name():
-    try:
-        if os.path.exists(DEVICE_NAME_FILE):
-            with open(DEVICE_NAME_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get('name', '')
-    except Exception as e:
-        print(f"Error loading device name: {e}")
-    return ''
+    return STATE.load(DEVICE_NAME_FILE, {}).get('name', '')
 
 def save_device_name(name):
-    try:
-        with open(DEVICE_NAME_FILE, 'w') as f:
-            json.dump({'name': name}, f)
-        return True
-    except Exception as e:
-        print(f"Error saving device name: {e}")
-        return False
+    return STATE.save(DEVICE_NAME_FILE, {'name': name})
 
 def load_slideshow_settings():
-    try:
-        if os.path.exists(SLIDESHOW_SETTINGS_FILE):
-            with open(SLIDESHOW_SETTINGS_FILE, 'r') as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"Error loading slideshow settings: {e}")
-    return {
+    return STATE.load(SLIDESHOW_SETTINGS_FILE, {
         'delay': 10,
         'transition': 'fade',
         'transition_duration': 3.0
-    }
+    })
 
 def save_slideshow_settings(settings):
-    try:
-        with open(SLIDESHOW_SETTINGS_FILE, 'w') as f:
-            json.dump(settings, f)
-        return True
-    except Exception as e:
-        print(f"Error saving slideshow settings: {e}")
-        return False
+    return STATE.save(SLIDESHOW_SETTINGS_FILE, settings)
 
 def load_selected_images():
-    try:
-        if os.path.exists(SELECTED_IMAGES_FILE):
-            with open(SELECTED_IMAGES_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get('selected', [])
-    except Exception as e:
-        print(f"Error loading selected images: {e}")
-    return []
+    return STATE.load(SELECTED_IMAGES_FILE, {}).get('selected', [])
 
 def save_selected_images(selected):
-    try:
-        with open(SELECTED_IMAGES_FILE, 'w') as f:
-            json.dump({'selected': selected}, f)
-        return True
-    except Exception as e:
-        print(f"Error saving selected images: {e}")
-        return False
+    return STATE.save(SELECTED_IMAGES_FILE, {'selected': selected})
 
 def load_slideshow_state():
-    try:
-        if os.path.exists(SLIDESHOW_STATE_FILE):
-            with open(SLIDESHOW_STATE_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get('active', False)
-    except Exception as e:
-        print(f"Error loading slideshow state: {e}")
-    return False
+    return STATE.load(SLIDESHOW_STATE_FILE, {}).get('active', False)
 
 def save_slideshow_state(active):
-    try:
-        with open(SLIDESHOW_STATE_FILE, 'w') as f:
-            json.dump({'active': active}, f)
-        return True
-    except Exception as e:
-        print(f"Error saving slideshow state: {e}")
-        return False
+    return STATE.save(SLIDESHOW_STATE_FILE, {'active': active})
+
+def file_content_hash(file_path):
+    """Return the SHA-256 of a file, reusing the last result while size and mtime are unchanged"""
+    stat = os.stat(file_path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with content_hashes_lock:
+        cached = content_hashes.get(file_path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+
+    with content_hashes_lock:
+        content_hashes[file_path] = (signature, digest)
+    return digest
+
+def forget_content_hash(file_path):
+    with content_hashes_lock:
+        content_hashes.pop(file_path, None)
+
+def thumbnail_key(content_hash, size=THUMBNAIL_SIZE, ext='jpg'):
+    return f"{content_hash}_{size[0]}x{size[1]}.{ext}"
 
-def generate_thumbnail(filename):
-    """Generate a thumbnail for an image and cache it"""
+def thumbnail_width(requested):
+    """Snap a requested width to the smallest bucket that covers it"""
+    if not requested:
+        return THUMBNAIL_SIZE[0]
+    return next((w for w in THUMBNAIL_WIDTHS if w >= requested), THUMBNAIL_WIDTHS[-1])
+
+def thumbnail_format(accept):
+    """Best encoding the browser lists explicitly in Accept (a bare */* gets JPEG)"""
+    listed = {value for value, quality in accept if quality > 0}
+    return next((f for f in THUMBNAIL_FORMATS if f[1] in listed), THUMBNAIL_FORMATS[-1])
+
+def generation_lock(key):
+    with generation_locks_lock:
+        return generation_locks.setdefault(key, Lock())
+
+def generate_thumbnail(filename, width=THUMBNAIL_SIZE[0], encoding=THUMBNAIL_FORMATS[-1]):
+    """Return a thumbnail for an image, generating and caching it on a miss
+
+    width is a THUMBNAIL_WIDTHS bucket and encoding a THUMBNAIL_FORMATS entry;
+    every variant is generated once and cached by content hash.
+    """
     try:
-        # Check if thumbnail is in cache
-        if filename in THUMBNAIL_CACHE:
-            return THUMBNAIL_CACHE[filename]
-        
         file_path = os.path.join(UPLOAD_FOLDER, filename)
         if not os.path.exists(file_path):
             return None
-        
-        # Open and create thumbnail
-        with Image.open(file_path) as img:
-            # Convert to RGB if necessary (handles PNG with transparency)
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', img.size, 'black')
-                background.paste(img, mask=img.split()[-1])
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            # Remove problematic profiles
-            if 'icc_profile' in img.info:
-                img.info.pop('icc_profile')
-            
-            img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-            
-            # Save to bytes
-            thumb_io = io.BytesIO()
-            img.save(thumb_io, 'JPEG', quality=85, icc_profile=None)
-            thumb_io.seek(0)
+
+        ext, _, pil_format, options = encoding
+        key = thumbnail_key(file_content_hash(file_path), (width, width), ext)
+        with generation_lock(key):
+            thumb_data = THUMBNAIL_CACHE.get(key)
+            if thumb_data is not None:
+                return thumb_data
             
-            # Cache the thumbnail using filename as key
-            THUMBNAIL_CACHE[filename] = thumb_io.getvalue()
-            return THUMBNAIL_CACHE[filename]
+            # Open and create thumbnail
+            with Image.open(file_path) as img:
+                img.draft('RGB', (width, width))  # Lets JPEG decode at reduced scale
+                img = render_cache.flatten_to_rgb(img)
+                img.thumbnail((width, width), Image.Resampling.LANCZOS)
+                
+                # Save to bytes
+                thumb_io = io.BytesIO()
+                img.save(thumb_io, pil_format, icc_profile=None, **options)
+                thumb_data = thumb_io.getvalue()
+
+            # Keyed by content hash so a re-upload under the same name never serves a stale thumbnail
+            THUMBNAIL_CACHE.put(key, thumb_data)
+            return thumb_data
     except Exception as e:
         print(f"Error generating thumbnail for {filename}: {e}")
         return None
 
+def generate_display_render(filename, size=DISPLAY_SIZE):
+    """Letterbox an image to a panel size and store it as a raw RGB render for display_image.py"""
+    try:
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        if not os.path.exists(file_path):
+            return None
+
+        render_path = render_cache.render_path(file_content_hash(file_path), size)
+        with generation_lock(render_path):
+            if os.path.exists(render_path):
+                return render_path
+
+            # Same letterboxing as display_image.py uses when it decodes a slide itself
+            with Image.open(file_path) as img:
+                render_cache.write_atomic(render_path, render_cache.letterbox(img, size))
+            return render_path
+    except Exception as e:
+        print(f"Error generating display render for {filename}: {e}")
+        return None
+
+def prune_renders():
+    """Drop renders for panel sizes and uploads no longer in use, and keep the rest under the byte cap"""
+    render_cache.prune_renders(render_cache.known_display_sizes(DISPLAY_SIZE))
+
+def update_render_manifest(filenames):
+    """Record the content hash of each upload so display_image.py can find its renders"""
+    entries = {}
+    for filename in filenames:
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        try:
+            entry = render_cache.file_signature(file_path)
+            entry['hash'] = file_content_hash(file_path)
+            entries[filename] = entry
+            IMAGE_CATALOG.set_hash(filename, entry['hash'])
+        except OSError:
+            continue
+    if entries:
+        render_cache.update_manifest(entries)
+
+def set_processing_status(filename, status, progress, notify=True):
+    if not notify:
+        return  # Background warm-up jobs are invisible to the UI
+    with processing_lock:
+        if status in ('done', 'error'):
+            processing_status.pop(filename, None)
+        else:
+            processing_status[filename] = {'status': status, 'progress': progress}
+    notify_clients('processing', {'filename': filename, 'status': status, 'progress': progress})
+
+def is_processing(filename):
+    with processing_lock:
+        return filename in processing_status
+
+def process_upload(filename, notify=True):
+    """Store the file by content, then generate its thumbnails and a render for every known panel size"""
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    try:
+        if content_store.adopt(file_path, file_content_hash(file_path)):
+            # Replaced by a link to an identical upload
+            forget_content_hash(file_path)
+            IMAGE_CATALOG.refresh(filename)
+    except OSError as e:
+        print(f"Error storing {filename}: {e}")
+
+    # The default JPEG first, then every variant the grid's srcset can ask for
+    default = (THUMBNAIL_SIZE[0], THUMBNAIL_FORMATS[-1])
+    variants = [default] + [(width, encoding) for encoding in THUMBNAIL_FORMATS for width in THUMBNAIL_WIDTHS
+                            if (width, encoding) != default]
+    for i, (width, encoding) in enumerate(variants):
+        set_processing_status(filename, 'thumbnail', 0.5 * i / len(variants), notify)
+        if generate_thumbnail(filename, width, encoding) is None:
+            set_processing_status(filename, 'error', 0.0, notify)
+            return
+
+    update_render_manifest([filename])
+    sizes = render_cache.known_display_sizes(DISPLAY_SIZE)
+    for i, size in enumerate(sizes):
+        set_processing_status(filename, 'render', 0.5 + 0.5 * i / len(sizes), notify)
+        if generate_display_render(filename, size) is None:
+            set_processing_status(filename, 'error', 0.5, notify)
+            return
+    prune_renders()
+
+    set_processing_status(filename, 'done', 1.0, notify)
+
+def processing_worker():
+    while True:
+        filename, notify = processing_queue.get()
+        try:
+            process_upload(filename, notify)
+        except Exception as e:
+            print(f"Error processing {filename}: {e}")
+            set_processing_status(filename, 'error', 0.0, notify)
+        finally:
+            processing_queue.task_done()
+
+def queue_processing(filename, notify=True):
+    """Hand an upload to the worker pool without blocking the request"""
+    set_processing_status(filename, 'queued', 0.0, notify)
+    try:
+        processing_queue.put_nowait((filename, notify))
+    except Full:
+        # Pool is saturated; the thumbnail route and the slideshow generate on demand instead
+        print(f"Processing queue full, deferring {filename}")
+        set_processing_status(filename, 'done', 0.0, notify)
+
+def warm_render_cache(filenames):
+    """Make sure renders exist for the panel sizes in use before a slideshow loads them
+
+    Only uploads missing a render are queued, so reordering a playlist whose
+    renders exist queues nothing.
+    """
+    update_render_manifest(filenames)
+    sizes = render_cache.known_display_sizes(DISPLAY_SIZE)
+    for filename in filenames:
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        try:
+            content_hash = file_content_hash(file_path)
+        except OSError:
+            continue
+        if not all(os.path.exists(render_cache.render_path(content_hash, size)) for size in sizes):
+            queue_processing(filename, notify=False)
+
+def upload_extensions():
+    extensions = upload_pipeline.allowed_extensions()
+    if pillow_heif is None:
+        extensions = tuple(ext for ext in extensions if ext not in upload_pipeline.EXTENSIONS['heif'])
+    return extensions
+
+def upload_size_cap():
+    """Largest width and height any known panel shows an image at"""
+    sizes = render_cache.known_display_sizes(DISPLAY_SIZE)
+    return max(w for w, _ in sizes), max(h for _, h in sizes)
+
+def unique_upload_name(filename, folder=UPLOAD_FOLDER):
+    """Only modify filename if it already exists in folder"""
+    name, ext = os.path.splitext(filename)
+    counter = 1
+    while os.path.exists(os.path.join(folder, filename)):
+        filename = f"{name}({counter}){ext}"
+        counter += 1
+    return filename
+
+def load_source_hashes():
+    return STATE.load(SOURCE_HASHES_FILE, {})
+
+def store_upload(session):
+    """Store a completed upload once by content, link a new name to it and catalog it
+
+    Bytes seen before, even if they were transcoded, skip decoding entirely.
+    MAX_IMAGES is checked again before the name is added, since uploads
+    running in parallel all passed the check when they started. Returns the
+    upload response.
+    """
+    part_path = session.path
+    output_path = part_path
+    name, ext = os.path.splitext(secure_filename(session.filename) or 'image')
+    content_hash = load_source_hashes().get(session.digest, session.digest)
+    stored = content_store.find_object(content_hash)
+    transcoded = False
+    store_ext = ext
+
+    if stored is None:
+        try:
+            with Image.open(part_path) as img:
+                img.load()  # Fails here on truncated or corrupt files
+                cap = upload_size_cap()
+                animated = getattr(img, 'n_frames', 1) > 1
+                oriented = img.getexif().get(0x0112, 1) != 1  # EXIF orientation
+                fits = img.width <= cap[0] and img.height <= cap[1]
+                passthrough = animated or (session.kind in PASSTHROUGH_FORMATS and fits and not oriented)
+                if not passthrough:
+                    # Normalize to an upright JPEG no larger than the biggest panel
+                    img = render_cache.flatten_to_rgb(ImageOps.exif_transpose(img))
+                    img.thumbnail(cap, Image.Resampling.LANCZOS)
+                    output_path = f"{part_path}.jpg"
+                    img.save(output_path, 'JPEG', quality=UPLOAD_JPEG_QUALITY)
+        except Exception as e:
+            for path in {part_path, output_path}:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise UploadError(f'Could not read image: {e}')
+
+        if not passthrough:
+            transcoded = True
+            content_hash = file_content_hash(output_path)
+            forget_content_hash(output_path)
+            STATE.save(SOURCE_HASHES_FILE, dict(load_source_hashes(), **{session.digest: content_hash}))
+            store_ext = '.jpg'
+
+    # The object is stored (or found again) and linked under the store lock, so
+    # a sweep between the two cannot see it unlinked and delete it
+    with upload_commit_lock, content_store.lock:
+        error = None
+        if len(IMAGE_CATALOG) >= MAX_IMAGES:
+            error = UploadError(f'Maximum {MAX_IMAGES} images allowed')
+        elif stored is not None and not os.path.exists(stored):
+            # Released since the lookup; only untranscoded bytes can stand in for it
+            stored = None
+            if content_hash != session.digest:
+                error = UploadError('Upload raced with a delete, please try again', 409)
+        if error:
+            for path in {part_path, output_path}:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise error
+        if stored is None:
+            stored = content_store.store(output_path, content_hash, store_ext)
+
+        filename = unique_upload_name(f"{name}{os.path.splitext(stored)[1]}")
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        content_store.link(stored, file_path)
+
+        if transcoded and KEEP_ORIGINALS:
+            os.makedirs(ORIGINALS_FOLDER, exist_ok=True)
+            # Never replace an original that another upload of the same name left behind
+            original = unique_upload_name(f"{name}{ext}", ORIGINALS_FOLDER)
+            os.replace(part_path, os.path.join(ORIGINALS_FOLDER, original))
+        elif os.path.exists(part_path):
+            os.remove(part_path)
+
+        # Hashed while it arrived, so processing never reads it back for that
+        stat = os.stat(file_path)
+        with content_hashes_lock:
+            content_hashes[file_path] = ((stat.st_size, stat.st_mtime_ns), content_hash)
+        update_render_manifest([filename])
+        return add_upload(filename, content_hash)
+
+def add_upload(filename, content_hash=None):
+    """Catalog a stored upload, queue its processing and tell clients; returns the upload response"""
+    copies = IMAGE_CATALOG.names_with_hash(content_hash) if content_hash else []
+    order = IMAGE_CATALOG.add(filename, content_hash)  # Appended to the end of the order
+
+    # Thumbnail and display render are generated in the background
+    queue_processing(filename)
+    
+    save_image_order({'order': order})
+    
+    response = {
+        'success': True,
+        'filename': filename,
+        'processing': is_processing(filename)
+    }
+    if copies:
+        response['duplicate_of'] = copies[0]  # Same bytes, stored once
+    return response
+
+def release_content(content_hash):
+    """Drop a hash's stored copy and caches once no upload name uses it"""
+    if IMAGE_CATALOG.names_with_hash(content_hash) or not content_store.release(content_hash):
+        return
+    THUMBNAIL_CACHE.discard(content_hash)
+    render_cache.discard_renders(content_hash)
+    sources = load_source_hashes()
+    if content_hash in sources.values():
+        STATE.save(SOURCE_HASHES_FILE, {source: stored for source, stored in sources.items() if stored != content_hash})
+
+def uploads_deleted(filenames, hashes):
+    """Bring the catalog, caches, selection and display up to date after deleting uploads"""
+    save_image_order({'order': IMAGE_CATALOG.remove(filenames)})
+    render_cache.update_manifest(removed=filenames)
+    # Drop stored copies and cached thumbnails unless another upload shares the same bytes
+    for content_hash in hashes:
+        release_content(content_hash)
+    prune_selection(set(filenames))
+    sync_display_playlist()
+
+def start_upload(filename, size):
+    if pillow_heif is None and filename.lower().endswith(upload_pipeline.EXTENSIONS['heif']):
+        raise UploadError('HEIC/HEIF uploads need the pillow-heif package')
+    if len(IMAGE_CATALOG) >= MAX_IMAGES:
+        raise UploadError(f'Maximum {MAX_IMAGES} images allowed')
+    return UPLOADS.start(filename, size, upload_extensions())
+
+for _ in range(PROCESSING_WORKERS):
+    Thread(target=processing_worker, daemon=True).start()
+
+IMAGE_CATALOG.watch(on_uploads_changed)
+Thread(target=prune_renders, daemon=True).start()
+
 def is_slideshow_running():
     """Check if slideshow process is actually running"""
     global slideshow_process
@@ -221,35 +760,114 @@ def is_slideshow_running():
         save_slideshow_state(False)
         return False
 
+def display_metrics():
+    """Frame timing, load times and memory reported by the running display, or None"""
+    reply = send_display_command('metrics')
+    if reply:
+        reply.pop('ok', None)
+    return reply
+
+def prometheus_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text(display):
+    """Service and display metrics in the Prometheus text exposition format"""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        """samples are (suffix, labels, value); suffix is '' except for histogram series"""
+        lines.append(f"# HELP pimenu_{name} {help_text}")
+        lines.append(f"# TYPE pimenu_{name} {kind}")
+        for suffix, labels, value in samples:
+            label_text = ','.join(f'{key}="{prometheus_label(val)}"' for key, val in labels.items())
+            lines.append(f"pimenu_{name}{suffix}{{{label_text}}} {value}" if label_text else f"pimenu_{name}{suffix} {value}")
+
+    metric('device_info', 'gauge', 'Device name as a label', [('', {'name': load_device_name()}, 1)])
+    metric('uploads', 'gauge', 'Images in the uploads folder', [('', {}, len(IMAGE_CATALOG))])
+    metric('event_clients', 'gauge', 'Open server-sent event streams', [('', {}, EVENTS.client_count())])
+    metric('app_resident_memory_bytes', 'gauge', 'Resident memory of the web service',
+           [('', {}, psutil.Process().memory_info().rss)])
+    metric('slideshow_running', 'gauge', 'Whether the slideshow is running and answering', [('', {}, int(display is not None))])
+    if display is None:
+        return '\n'.join(lines) + '\n'
+
+    phases = display['phases']
+    metric('display_current_slide', 'gauge', 'Index of the slide on screen',
+           [('', {}, -1 if display['current_index'] is None else display['current_index'])])
+    metric('display_slides', 'gauge', 'Slides in the playlist', [('', {}, display['slides'])])
+    metric('display_paused', 'gauge', 'Whether the slideshow is paused', [('', {}, int(display['paused']))])
+    metric('display_slide_switches_total', 'counter', 'Slide changes since the display started', [('', {}, display['switches'])])
+    metric('display_uptime_seconds', 'gauge', 'Seconds since the display started', [('', {}, display['uptime_seconds'])])
+    metric('display_fps', 'gauge', 'Achieved frames per second by render phase',
+           [('', {'phase': phase}, totals['fps']) for phase, totals in phases.items()])
+    metric('display_frames_total', 'counter', 'Frames presented by render phase',
+           [('', {'phase': phase}, totals['frames']) for phase, totals in phases.items()])
+    metric('display_cpu_seconds_total', 'counter', 'CPU time of the render loop by phase',
+           [('', {'phase': phase}, totals['cpu_seconds']) for phase, totals in phases.items()])
+
+    samples = []
+    for phase, histogram in display['frame_histograms'].items():
+        count = 0
+        for bound, bucket in zip(display['frame_buckets_ms'] + ['+Inf'], histogram['buckets']):
+            count += bucket
+            le = bound if bound == '+Inf' else round(bound / 1000, 6)
+            samples.append(('_bucket', {'phase': phase, 'le': le}, count))
+        samples.append(('_sum', {'phase': phase}, histogram['sum_seconds']))
+        samples.append(('_count', {'phase': phase}, count))
+    metric('display_frame_seconds', 'histogram', 'Time between consecutive frames by render phase', samples)
+
+    metric('display_image_load_seconds', 'gauge', 'Time the last decode of each image took',
+           [('', {'image': os.path.basename(path)}, seconds) for path, seconds in display['load_seconds'].items()])
+    metric('display_decoded_bytes', 'gauge', 'Pixel memory of decoded slides', [('', {}, display['decoded_bytes'])])
+    metric('display_prerender_bytes', 'gauge', 'Pixel memory of prerendered transition frames', [('', {}, display['prerender_bytes'])])
+    animation = display.get('animation')
+    if animation:
+        metric('display_animation_playing', 'gauge', 'Whether the slide on screen is animated', [('', {}, int(animation['playing']))])
+        metric('display_animation_frames', 'gauge', 'Frames in the animated slide on screen', [('', {}, animation['frames'])])
+        metric('display_animation_loop_seconds', 'gauge', 'Length of one loop of the animated slide on screen',
+               [('', {}, animation['loop_seconds'])])
+        metric('display_animation_buffered_frames', 'gauge', 'Decoded frames waiting to be shown',
+               [('', {}, animation['buffered_frames'])])
+        metric('display_animation_lag_frames', 'gauge', 'Frames the animation on screen trails its schedule by',
+               [('', {}, animation['lag_frames'])])
+        metric('display_animation_frames_total', 'counter', 'Animation frames presented since the display started',
+               [('', {}, animation['frames_shown'])])
+        metric('display_animation_dropped_frames_total', 'counter', 'Animation frames decoded too late and skipped',
+               [('', {}, animation['frames_dropped'])])
+    metric('display_resident_memory_bytes', 'gauge', 'Resident memory of the display process', [('', {}, display['rss_bytes'])])
+    return '\n'.join(lines) + '\n'
+
+def metrics_publisher():
+    """Send display metrics to open pages every METRICS_INTERVAL while the slideshow runs"""
+    while True:
+        time.sleep(METRICS_INTERVAL)
+        if EVENTS.client_count() and is_slideshow_running():
+            display = display_metrics()
+            if display:
+                notify_clients('display_metrics', display)
+
+Thread(target=metrics_publisher, daemon=True).start()
+
+@app.route('/metrics')
+def metrics():
+    return Response(prometheus_text(display_metrics()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/')
 def index():
+    # Taken first: the page replays anything published while it is rendered
+    event_id = EVENTS.last_id()
+
     # Load initial state
-    saved_order = load_image_order()
     slideshow_settings = load_slideshow_settings()
     device_name = load_device_name()
     selected_images = load_selected_images()
     
     # Check actual slideshow state instead of relying on saved state
     slideshow_active = is_slideshow_running()
-    save_slideshow_state(slideshow_active)  # Update state file to match reality
-    
-    # Get all images from upload folder
-    images = []
-    files = os.listdir(UPLOAD_FOLDER)
+    save_slideshow_state(slideshow_active)  # Update state file to match reality (only written if it changed)
     
-    # First add files that are in the saved order
-    for filename in saved_order.get('order', []):
-        if filename in files:
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            upload_time = datetime.fromtimestamp(os.path.getctime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
-            images.append({'name': filename, 'upload_time': upload_time})
-            files.remove(filename)
-    
-    # Then add any remaining files
-    for filename in files:
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        upload_time = datetime.fromtimestamp(os.path.getctime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
-        images.append({'name': filename, 'upload_time': upload_time})
+    catalog_version, entries = IMAGE_CATALOG.snapshot()
+    images = [image_info(entry) for entry in entries]
     
     return render_template('index.html', 
                          images=images, 
@@ -257,83 +875,92 @@ def index():
                          slideshow_active=slideshow_active,
                          device_name=device_name,
                          selected_images=selected_images,
-                         max_images=MAX_IMAGES)
+                         max_images=MAX_IMAGES,
+                         event_id=event_id,
+                         catalog_version=catalog_version,
+                         thumbnail_sizes=THUMBNAIL_SIZES_ATTR,
+                         max_upload_bytes=upload_pipeline.MAX_UPLOAD_BYTES,
+                         upload_accept=','.join(('image/*',) + upload_extensions()))
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    """Single-request upload of a whole file, run through the same pipeline as chunked uploads"""
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
     
     file = request.files['file']
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
-    
-    if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-        return jsonify({'error': 'Invalid file type'}), 400
-
-    # Check max images limit
-    current_images = len(os.listdir(UPLOAD_FOLDER))
-    if current_images >= MAX_IMAGES:
-        return jsonify({'error': f'Maximum {MAX_IMAGES} images allowed'}), 400
 
     try:
-        # Get original filename and secure it
-        filename = secure_filename(file.filename)
-        name, ext = os.path.splitext(filename)
-        
-        # Only modify filename if it already exists
-        counter = 1
-        while os.path.exists(os.path.join(UPLOAD_FOLDER, filename)):
-            filename = f"{name}({counter}){ext}"
-            counter += 1
-        
-        # Save the file
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(file_path)
-        
-        # Load current order and append new file
-        saved_order = load_image_order()
-        order = saved_order.get('order', [])
-        if filename not in order:
-            order.append(filename)  # Add to end of list
-            save_image_order({'order': order})
-        
-        # Get all files in upload directory
-        existing_files = set(os.listdir(UPLOAD_FOLDER))
-        
-        # Build ordered image list
-        images = []
-        
-        # First add files that are in the saved order
-        for fname in order:
-            if fname in existing_files:
-                fpath = os.path.join(UPLOAD_FOLDER, fname)
-                upload_time = datetime.fromtimestamp(os.path.getctime(fpath)).strftime('%Y-%m-%d %H:%M:%S')
-                images.append({'name': fname, 'upload_time': upload_time})
-                existing_files.remove(fname)
-        
-        # Then add any remaining files
-        for fname in sorted(existing_files):
-            fpath = os.path.join(UPLOAD_FOLDER, fname)
-            upload_time = datetime.fromtimestamp(os.path.getctime(fpath)).strftime('%Y-%m-%d %H:%M:%S')
-            images.append({'name': fname, 'upload_time': upload_time})
-        
-        # Notify clients about the updated image list
-        notify_clients('image_list', {'images': images})
-        
-        return jsonify({
-            'success': True,
-            'filename': filename
-        })
+        file.stream.seek(0, os.SEEK_END)
+        size = file.stream.tell()
+        file.stream.seek(0)
+        session = start_upload(file.filename, size)
+        if not UPLOADS.write(session.id, 0, file.stream).complete:
+            UPLOADS.discard(session.id)
+            return jsonify({'error': 'Incomplete upload'}), 400
+        return jsonify(store_upload(UPLOADS.finish(session.id)))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         print(f"Error saving file: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/upload/start', methods=['POST'])
+def upload_start():
+    """Open a chunked upload: {"filename", "size"} -> {"id", "offset", "size", "chunk_size"}"""
+    data = request.json or {}
+    try:
+        session = start_upload(data.get('filename', ''), int(data.get('size', 0)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid size'}), 400
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(dict(session.state(), chunk_size=upload_pipeline.CHUNK_SIZE))
+
+@app.route('/upload/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def upload_chunk(upload_id):
+    """GET the resume offset, PUT the chunk at ?offset=N, or DELETE to abandon the upload"""
+    try:
+        if request.method == 'GET':
+            return jsonify(UPLOADS.get(upload_id).state())
+        if request.method == 'DELETE':
+            UPLOADS.discard(upload_id)
+            return '', 204
+
+        session = UPLOADS.write(upload_id, request.args.get('offset', -1, type=int), request.stream)
+        if not session.complete:
+            return jsonify(session.state())
+        return jsonify(store_upload(UPLOADS.finish(upload_id)))
+    except UploadError as e:
+        reply = {'error': str(e)}
+        if e.offset is not None:
+            reply['offset'] = e.offset
+        return jsonify(reply), e.status
+    except Exception as e:
+        print(f"Error saving upload {upload_id}: {e}")
+        UPLOADS.discard(upload_id)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/images')
+def images_snapshot():
+    """Full image list with its catalog version and the selection, for browsers that missed delta events"""
+    version, entries = IMAGE_CATALOG.snapshot()
+    return jsonify({
+        'version': version,
+        'images': [image_info(entry) for entry in entries],
+        'selected': load_selected_images(),
+    })
+
 @app.route('/delete/<filename>', methods=['POST'])
 def delete_file(filename):
     file_path = os.path.join(UPLOAD_FOLDER, filename)
     if os.path.exists(file_path):
+        content_hash = file_content_hash(file_path)
         os.remove(file_path)
+        forget_content_hash(file_path)
+        uploads_deleted([filename], {content_hash})
     return redirect(url_for('index'))
 
 @app.route('/display/<filename>', methods=['POST'])
@@ -346,13 +973,14 @@ def display_file(filename):
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    """Serve an upload with a content-hash ETag; Range and conditional requests are honoured"""
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    content_hash = file_content_hash(file_path) if os.path.isfile(file_path) else None
+    response = send_from_directory(UPLOAD_FOLDER, filename, etag=content_hash or True, conditional=True)
+    return cache_for(response, bool(content_hash) and request.args.get('v') == content_version(content_hash))
 
 @app.route('/slideshow', methods=['POST'])
 def slideshow():
-    global slideshow_process
-    stop_slideshow()
-    
     data = request.json
     images = data.get('images', [])
     settings = {
@@ -365,18 +993,20 @@ def slideshow():
     if save_slideshow_settings(settings):
         notify_clients('slideshow_settings', settings)
     
-    if images:
-        image_paths = ','.join(os.path.join(UPLOAD_FOLDER, img) for img in images)
-        slideshow_process = subprocess.Popen([
-            'python3', 
-            'display_image.py', 
-            image_paths,
-            str(settings['delay']),
-            settings['transition'],
-            str(settings['transition_duration'])
-        ])
-        save_slideshow_state(True)
-        notify_clients('slideshow_state', {'active': True})
+    if not images:
+        stop_slideshow()
+        return '', 204
+
+    warm_render_cache(images)
+    image_paths = [os.path.join(UPLOAD_FOLDER, img) for img in images]
+
+    # Reuse the running display (and the slides it has decoded) instead of restarting it
+    if send_display_command('set_settings', **settings) and send_display_command('set_playlist', images=image_paths):
+        return '', 204
+
+    stop_slideshow()
+    start_slideshow_process(image_paths, settings)
+    notify_clients('slideshow_state', {'active': True})
     
     return '', 204
 
@@ -389,9 +1019,10 @@ def stop_slideshow_route():
 
 @app.route('/update_order', methods=['POST'])
 def update_order():
-    order = request.json.get('order', [])
+    # Only names on disk are kept, so stale or made-up names never reach the display
+    order = IMAGE_CATALOG.reorder(request.json.get('order', []))  # Other browsers get an image_moved event
     save_image_order({'order': order})
-    notify_clients('image_order', {'order': order})
+    sync_display_playlist()
     return jsonify({'status': 'success'})
 
 @app.route('/delete_images', methods=['POST'])
@@ -400,51 +1031,19 @@ def delete_images():
     if not images:
         return jsonify({'error': 'No images specified'}), 400
     
-    # Load current order
-    saved_order = load_image_order()
-    order = saved_order.get('order', [])
-    
+    hashes = set()
     for filename in images:
         file_path = os.path.join(UPLOAD_FOLDER, filename)
         try:
             if os.path.exists(file_path):
+                hashes.add(file_content_hash(file_path))
                 os.remove(file_path)
-                # Remove from order if present
-                if filename in order:
-                    order.remove(filename)
-                # Clear thumbnail from cache using filename
-                if filename in THUMBNAIL_CACHE:
-                    del THUMBNAIL_CACHE[filename]
+                forget_content_hash(file_path)
         except Exception as e:
             print(f"Error deleting {filename}: {e}")
             return jsonify({'error': f'Failed to delete {filename}'}), 500
     
-    # Save updated order
-    save_image_order({'order': order})
-    
-    # Get all files in upload directory
-    existing_files = set(os.listdir(UPLOAD_FOLDER))
-    
-    # Build ordered image list
-    images = []
-    
-    # First add files that are in the saved order
-    for filename in order:
-        if filename in existing_files:
-            file_path = os.path.join(UPLOAD_FOLDER, filename)
-            upload_time = datetime.fromtimestamp(os.path.getctime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
-            images.append({'name': filename, 'upload_time': upload_time})
-            existing_files.remove(filename)
-    
-    # Then add any remaining files that weren't in the order
-    for filename in sorted(existing_files):
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
-        upload_time = datetime.fromtimestamp(os.path.getctime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
-        images.append({'name': filename, 'upload_time': upload_time})
-    
-    # Notify clients about the updated image list
-    notify_clients('image_list', {'images': images})
-    
+    uploads_deleted(images, hashes)
     return jsonify({'status': 'success'})
 
 @app.route('/get_device_name')
@@ -467,50 +1066,47 @@ def get_slideshow_settings():
     settings = load_slideshow_settings()
     return jsonify(settings)
 
+@app.route('/get_slideshow_state')
+def get_slideshow_state():
+    return jsonify({'active': is_slideshow_running()})
+
 @app.route('/save_settings', methods=['POST'])
 def save_settings():
     settings = request.json
     if save_slideshow_settings(settings):
         # Notify all clients about the settings change
         notify_clients('slideshow_settings', settings)
+        # A running slideshow picks the change up on its next frame
+        send_display_command('set_settings', **{
+            key: settings[key] for key in ('delay', 'transition', 'transition_duration') if key in settings
+        })
         return jsonify({'status': 'success'})
     return jsonify({'status': 'error', 'message': 'Failed to save settings'}), 500
 
 @app.route('/events')
 def events():
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
     def generate():
-        client_queue = Queue()
-        with clients_lock:
-            clients.append(client_queue)
-        
+        # Subscribed on the first read, so a client gone before then never holds a slot
+        subscriber = EVENTS.subscribe(last_event_id)
+        if subscriber is None:
+            # Too many streams open; ask the browser to come back later
+            yield "retry: 10000\n\n"
+            return
         try:
-            while True:
-                try:
-                    event = client_queue.get(timeout=20)  # 20 second timeout
-                    event_data = f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
-                    yield event_data
-                except Empty:  # Fixed: Use imported Empty exception
-                    yield "data: ping\n\n"  # Keep connection alive
-                except GeneratorExit:  # Client disconnected
-                    break
-                except Exception as e:  # Other errors
-                    print(f"SSE Error: {e}")
-                    break
+            yield "retry: 3000\n\n"
+            deadline = time.time() + SSE_STREAM_LIFETIME
+            while time.time() < deadline and not subscriber.closed:
+                chunks = subscriber.get(timeout=SSE_PING_INTERVAL)
+                yield ''.join(chunks) if chunks else ": ping\n\n"  # Keep connection alive
         finally:
             # Always clean up the client connection
-            with clients_lock:
-                if client_queue in clients:
-                    clients.remove(client_queue)
-            try:
-                # Try to drain the queue to prevent resource leaks
-                while not client_queue.empty():
-                    client_queue.get_nowait()
-            except:
-                pass
+            EVENTS.unsubscribe(subscriber)
     
+    # No Connection header: it is hop-by-hop, which WSGI servers like waitress refuse
     return Response(generate(), mimetype='text/event-stream', headers={
-        'Cache-Control': 'no-cache',
-        'Connection': 'keep-alive'
+        'Cache-Control': 'no-cache'
     })
 
 @app.route('/update_selected', methods=['POST'])
@@ -518,33 +1114,82 @@ def update_selected():
     selected = request.json.get('selected', [])
     if save_selected_images(selected):
         notify_clients('selected_images', {'selected': selected})
+        sync_display_playlist()
         return jsonify({'status': 'success'})
     return jsonify({'status': 'error', 'message': 'Failed to save selected images'}), 500
 
 @app.route('/thumbnail/<filename>')
 def thumbnail(filename):
-    if not os.path.exists(os.path.join(UPLOAD_FOLDER, filename)):
+    file_path = os.path.join(UPLOAD_FOLDER, filename)
+    if not os.path.exists(file_path):
         return '', 404
     
     try:
-        thumb_data = generate_thumbnail(filename)
-        if thumb_data:
-            return Response(thumb_data, mimetype='image/jpeg')
-        return '', 500
+        content_hash = file_content_hash(file_path)
+        width = thumbnail_width(request.args.get('w', type=int))
+        encoding = thumbnail_format(request.accept_mimetypes)
+        etag = thumbnail_key(content_hash, (width, width), encoding[0])
+        immutable = request.args.get('v') == content_version(content_hash)
+
+        # Revalidation needs only the (cached) hash, not the thumbnail itself
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.vary.add('Accept')
+            return cache_for(response, immutable)
+
+        thumb_data = generate_thumbnail(filename, width, encoding)
+        if not thumb_data:
+            return '', 500
+        response = Response(thumb_data, mimetype=encoding[1])
+        response.set_etag(etag)
+        response.vary.add('Accept')  # Same URL, different encoding per browser
+        response.last_modified = os.path.getmtime(file_path)
+        return cache_for(response.make_conditional(request), immutable)
     except Exception as e:
         print(f"Error serving thumbnail for {filename}: {e}")
         return '', 500
 
+def shutdown():
+    """Stop the display and write pending state before the service exits"""
+    EVENTS.close()
+    stop_slideshow()
+    STATE.flush()
+
+def handle_stop_signal(signum, frame):
+    EVENTS.close()  # Ends open streams so their threads are free when the server stops
+    raise KeyboardInterrupt
+
+def serve(port, threads):
+    """Run under waitress with a fixed pool of worker threads"""
+    try:
+        import waitress
+    except ImportError:
+        print("Error: --serve needs the waitress package (pip install waitress)")
+        sys.exit(1)
+    # Event streams never take the last few threads, however many browsers are open
+    EVENTS.max_clients = max(1, min(EVENTS.max_clients, threads - SERVE_SPARE_THREADS))
+    server = waitress.create_server(app, host='0.0.0.0', port=port, threads=threads)
+    print(f"Serving on port {port} with {threads} threads ({EVENTS.max_clients} for event streams)")
+    server.run()
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='PiMenu Manager')
     parser.add_argument('--start', action='store_true', help='Start slideshow with saved settings')
     parser.add_argument('--port', type=int, default=5000, help='Port to run the service on (default: 5000)')
+    parser.add_argument('--serve', action='store_true', help='Run under the waitress production server instead of the development server')
+    parser.add_argument('--threads', type=int, default=SERVE_THREADS, help=f'Worker threads for --serve (default: {SERVE_THREADS})')
+    parser.add_argument('--keep-originals', action='store_true', help=f'Keep transcoded uploads as received in {ORIGINALS_FOLDER}/')
     args = parser.parse_args()
+    KEEP_ORIGINALS = args.keep_originals
     
     # Validate port number
     if args.port < 1 or args.port > 65535:
         print("Error: Port number must be between 1 and 65535")
         sys.exit(1)
+    if args.threads < SERVE_SPARE_THREADS + 1:
+        print(f"Error: --threads must be at least {SERVE_SPARE_THREADS + 1}")
+        sys.exit(1)
     
     if args.start:
         # Load saved settings and selected images
@@ -562,15 +1207,19 @@ if __name__ == '__main__':
             sys.exit(1)
             
         # Start slideshow process
-        slideshow_process = subprocess.Popen([
-            'python3',
-            'display_image.py',
-            ','.join(image_paths),
-            str(settings['delay']),
-            settings['transition'],
-            str(settings['transition_duration'])
-        ])
-        save_slideshow_state(True)
+        warm_render_cache(selected_images)
+        start_slideshow_process(image_paths, settings)
     
-    print(f"Starting service on port {args.port}")
-    app.run(host='0.0.0.0', port=args.port) 
\ No newline at end of file
+    signal.signal(signal.SIGTERM, handle_stop_signal)
+    signal.signal(signal.SIGINT, handle_stop_signal)
+    try:
+        if args.serve:
+            serve(args.port, args.threads)
+        else:
+            print(f"Starting service on port {args.port}")
+            app.run(host='0.0.0.0', port=args.port)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Shutting down")
+        shutdown() 
\ No newline at end of file
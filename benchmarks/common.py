@@ -0,0 +1,56 @@
+"""Helpers shared by the benchmark scripts
+
+Size parsing, the percentile definition and the synthetic images live here
+so every benchmark reports comparable numbers. percentile() is the same
+nearest-rank percentile display_image.FrameStats uses; it is repeated
+rather than imported so the web benchmarks do not load pygame into the
+process whose memory they measure.
+"""
+import io
+import os
+import random
+from PIL import Image, ImageDraw
+
+SIZE_PRESETS = {'720p': (1280, 720), '1080p': (1920, 1080), '4k': (3840, 2160)}
+
+def parse_size(value):
+    """WIDTHxHEIGHT, or one of SIZE_PRESETS, as a (width, height) tuple"""
+    if value.lower() in SIZE_PRESETS:
+        return SIZE_PRESETS[value.lower()]
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sequence, or 0.0 when empty"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+def make_image(size, seed):
+    """RGB image with enough detail that decode, encode and blit costs are realistic"""
+    rng = random.Random(seed)
+    width, height = size
+    img = Image.new('RGB', size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(150):
+        x, y = rng.randrange(width), rng.randrange(height)
+        box = (x, y, x + rng.randrange(1, max(2, width // 3)), y + rng.randrange(1, max(2, height // 3)))
+        draw.rectangle(box, fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return img
+
+def make_jpeg(size, seed, quality=90):
+    """make_image encoded as JPEG bytes"""
+    buffer = io.BytesIO()
+    make_image(size, seed).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+def write_jpegs(folder, count, size):
+    """Write count images named slideNN.jpg to folder; returns their names"""
+    os.makedirs(folder, exist_ok=True)
+    names = [f"slide{i:02d}.jpg" for i in range(count)]
+    for i, name in enumerate(names):
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(make_jpeg(size, i))
+    return names
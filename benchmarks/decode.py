@@ -0,0 +1,82 @@
+"""Slide decode throughput benchmark
+
+Times how long display_image.SlideWindow takes to decode and letterbox a
+whole playlist (lookahead "all") with one loader thread and with
+DECODE_WORKERS, against the old serial pygame.image.load + smoothscale loop.
+Images are synthetic JPEGs written to a scratch folder; the render cache is
+not used, so every slide is a real decode.
+
+    python benchmarks/decode.py --images 49 --image-size 4032x3024 --size 1920x1080
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+import display_image
+from common import parse_size, write_jpegs
+
+def legacy_load(path, screen_width, screen_height):
+    """One slide the way load_and_scale_image decoded it before the Pillow pipeline"""
+    img = pygame.image.load(path).convert()
+    aspect_ratio = img.get_width() / img.get_height()
+    if screen_width / screen_height > aspect_ratio:
+        new_height = screen_height
+        new_width = int(new_height * aspect_ratio)
+    else:
+        new_width = screen_width
+        new_height = int(new_width / aspect_ratio)
+    scaled_img = pygame.transform.smoothscale(img, (new_width, new_height))
+    display_surface = pygame.Surface((screen_width, screen_height))
+    display_surface.blit(scaled_img, ((screen_width - new_width) // 2, (screen_height - new_height) // 2))
+    return display_surface
+
+def time_window(paths, size, workers):
+    start = time.perf_counter()
+    window = display_image.SlideWindow(paths, size[0], size[1], {}, lookahead=None, workers=workers)
+    with window.condition:
+        while window.progress() < 1.0:
+            window.condition.wait()
+    elapsed = time.perf_counter() - start
+    window.stop()
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark slide decoding')
+    parser.add_argument('--images', type=int, default=49, help='Slides in the playlist (default: 49)')
+    parser.add_argument('--image-size', type=parse_size, default=(4032, 3024), help='Source size as WIDTHxHEIGHT (default: 4032x3024)')
+    parser.add_argument('--size', type=parse_size, default=(1920, 1080), help='Screen size as WIDTHxHEIGHT (default: 1920x1080)')
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='pimenu-decode-')
+    try:
+        paths = [os.path.join(folder, name) for name in write_jpegs(folder, args.images, args.image_size)]
+        pygame.init()
+        pygame.display.set_mode(args.size)
+
+        start = time.perf_counter()
+        for path in paths:
+            legacy_load(path, *args.size)
+        results = [('legacy serial', time.perf_counter() - start)]
+        with contextlib.redirect_stdout(io.StringIO()):  # Silence the per-slide loader output
+            for workers in sorted({1, display_image.DECODE_WORKERS}):
+                results.append((f"{workers} worker{'s' if workers > 1 else ''}", time_window(paths, args.size, workers)))
+        pygame.quit()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"{args.images} images {args.image_size[0]}x{args.image_size[1]} -> {args.size[0]}x{args.size[1]}, {os.cpu_count()} CPUs")
+    print(f"{'loader':<16}{'seconds':>9}{'ms/image':>10}{'speedup':>9}")
+    for name, seconds in results:
+        print(f"{name:<16}{seconds:>9.2f}{seconds * 1000 / args.images:>10.1f}{results[0][1] / seconds:>8.1f}x")
+
+if __name__ == '__main__':
+    main()
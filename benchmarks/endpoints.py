@@ -0,0 +1,171 @@
+"""Latency benchmark for the web endpoints
+
+Runs app.py in-process with Flask's test client against a scratch folder of
+synthetic uploads, so runs are reproducible and never touch real data. The
+folder starts --uploads short of MAX_IMAGES and is filled up to it by the
+upload phase. Reports p50/p95/p99 latency, throughput and process RSS for
+each endpoint; /events is measured as the time for one published event to
+reach every connected stream.
+
+    python benchmarks/endpoints.py --images 44 --size 1920x1080 --json results.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import resource
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import psutil
+from common import parse_size, percentile, make_jpeg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def summarize(latencies, elapsed):
+    return {
+        'count': len(latencies),
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'requests_per_second': len(latencies) / elapsed if elapsed else None,
+        'rss_mb': psutil.Process().memory_info().rss / (1024 * 1024),
+    }
+
+def timed(requests):
+    """Run each request callable, failing on error statuses; returns a summary"""
+    latencies = []
+    start = time.perf_counter()
+    for send in requests:
+        request_start = time.perf_counter()
+        response = send()
+        latencies.append(time.perf_counter() - request_start)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.request.path} returned {response.status_code}")
+    return summarize(latencies, time.perf_counter() - start)
+
+def wait_for_processing(app):
+    app.processing_queue.join()
+
+def bench_events(app, clients, events):
+    """Fan-out latency: time from publish until every stream has received the event"""
+    received = [[] for _ in range(clients)]
+    ready = threading.Barrier(clients + 1)
+
+    def consume(index):
+        response = app.app.test_client().get('/events', buffered=False)
+        chunks = iter(response.response)
+        next(chunks)  # retry: line
+        ready.wait()
+        for chunk in chunks:
+            text = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if 'event: device_name' in text:
+                received[index].append(time.perf_counter())
+
+    threads = [threading.Thread(target=consume, args=(i,), daemon=True) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(events):
+        sent = time.perf_counter()
+        app.notify_clients('device_name', {'name': f"bench-{i}"})
+        while any(len(times) <= i for times in received):
+            time.sleep(0.0005)
+        latencies.append(max(times[i] for times in received) - sent)
+    elapsed = time.perf_counter() - start
+    app.EVENTS.close()
+    for thread in threads:
+        thread.join(timeout=5)
+    return summarize(latencies, elapsed)
+
+def run(app, args):
+    client = app.app.test_client()
+    images = [make_jpeg(args.size, i) for i in range(args.images + args.uploads)]
+    for i, data in enumerate(images[:args.images]):
+        with open(os.path.join(app.UPLOAD_FOLDER, f"slide{i:02d}.jpg"), 'wb') as f:
+            f.write(data)
+    names = [f"slide{i:02d}.jpg" for i in range(args.images)]
+    results = {}
+
+    results['index'] = timed([lambda: client.get('/')] * args.repeat)
+    results['images'] = timed([lambda: client.get('/images')] * args.repeat)
+
+    # Each thumbnail is generated once, then served from the cache or revalidated
+    results['thumbnail_cold'] = timed([lambda name=name: client.get(f"/thumbnail/{name}?w=320") for name in names])
+    warm = [lambda name=name: client.get(f"/thumbnail/{name}?w=320") for name in names]
+    results['thumbnail_warm'] = timed(warm * max(1, args.repeat // len(names)))
+    etags = {name: client.get(f"/thumbnail/{name}?w=320").headers['ETag'] for name in names}
+    revalidate = [lambda name=name: client.get(f"/thumbnail/{name}?w=320", headers={'If-None-Match': etags[name]})
+                  for name in names]
+    results['thumbnail_304'] = timed(revalidate * max(1, args.repeat // len(names)))
+
+    uploaded = [f"upload{i:02d}.jpg" for i in range(args.uploads)]
+    results['upload'] = timed([
+        lambda name=name, data=data: client.post('/upload', data={'file': (io.BytesIO(data), name)},
+                                                 content_type='multipart/form-data')
+        for name, data in zip(uploaded, images[args.images:])
+    ])
+    wait_for_processing(app)
+    results['index_full'] = timed([lambda: client.get('/')] * args.repeat)
+    results['delete_images'] = timed([
+        lambda name=name: client.post('/delete_images', json={'images': [name]}) for name in uploaded
+    ])
+
+    for clients in args.sse_clients:
+        app.EVENTS.max_clients = max(app.EVENTS.max_clients, clients)
+        results[f"events_{clients}"] = bench_events(app, clients, args.repeat)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the web endpoints')
+    parser.add_argument('--images', type=int, default=None, help='Uploads present at the start (default: MAX_IMAGES minus --uploads)')
+    parser.add_argument('--uploads', type=int, default=5, help='Images uploaded and then deleted (default: 5)')
+    parser.add_argument('--size', type=parse_size, default=(1920, 1080), help='Image size as WIDTHxHEIGHT (default: 1920x1080)')
+    parser.add_argument('--repeat', type=int, default=100, help='Requests per warm endpoint (default: 100)')
+    parser.add_argument('--sse-clients', type=int, nargs='*', default=[1, 16], help='Event stream counts to measure (default: 1 16)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    # app.py works on folders relative to the current directory
+    folder = tempfile.mkdtemp(prefix='pimenu-bench-')
+    os.chdir(folder)
+    try:
+        import app
+        if args.images is None:
+            args.images = app.MAX_IMAGES - args.uploads
+        if args.images + args.uploads > app.MAX_IMAGES:
+            parser.error(f"--images plus --uploads must not exceed {app.MAX_IMAGES}")
+        results = run(app, args)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"{args.images} images of {args.size[0]}x{args.size[1]}; latency in ms")
+    print(f"{'endpoint':<16}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'rss MB':>9}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['count']:>7}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['requests_per_second']:>9.1f}{r['rss_mb']:>9.1f}")
+
+    if json_path:
+        report = {
+            'config': {'images': args.images, 'uploads': args.uploads, 'size': list(args.size),
+                       'repeat': args.repeat, 'sse_clients': args.sse_clients},
+            'platform': {'machine': platform.machine(), 'python': platform.python_version(),
+                         'cpus': os.cpu_count()},
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KiB on Linux
+            'results': results,
+        }
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {json_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Concurrent-client load test for the web service
+
+Starts app.py in a scratch folder with synthetic uploads, holds a number of
+/events streams open the way admin browser tabs do, and meanwhile requests
+pages, the image list and thumbnails from several worker threads. Reports
+how many streams were accepted, request latency percentiles and how long
+the server took to shut down on SIGTERM, once for the development server
+and once for --serve.
+
+    python benchmarks/server_load.py --streams 20 --workers 8 --duration 10
+"""
+import os
+import sys
+import time
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from common import parse_size, percentile, write_jpegs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REQUEST_TIMEOUT = 10  # Seconds before a request counts as failed
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def request(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=REQUEST_TIMEOUT)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+def wait_until_up(port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            request(port, '/images')
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+def hold_stream(port, accepted, stop):
+    """Keep one /events stream open until stop is set; records whether it was accepted"""
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=REQUEST_TIMEOUT)
+        conn.request('GET', '/events')
+        response = conn.getresponse()
+        first = response.readline()
+        accepted.append(first.startswith(b'retry: 3000'))
+        response.readline()
+        # A refused stream ends straight away; an accepted one is held like a browser would
+        while not stop.is_set() and accepted[-1]:
+            stop.wait(0.5)
+        conn.close()
+    except OSError:
+        accepted.append(False)
+
+def work(port, paths, latencies, errors, stop):
+    i = 0
+    while not stop.is_set():
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            status = request(port, path)
+            if status >= 400:
+                errors.append(status)
+                continue
+        except OSError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+def run(mode, args):
+    folder = tempfile.mkdtemp(prefix='pimenu-load-')
+    try:
+        names = write_jpegs(os.path.join(folder, 'uploads'), args.images, args.image_size)
+        port = free_port()
+        command = [sys.executable, os.path.join(ROOT, 'app.py'), '--port', str(port)]
+        if mode == 'serve':
+            command += ['--serve', '--threads', str(args.threads)]
+        process = subprocess.Popen(command, cwd=folder, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(port, process)
+            paths = ['/', '/images'] + [f"/thumbnail/{name}?w=320" for name in names]
+
+            stop = threading.Event()
+            accepted = []
+            streams = [threading.Thread(target=hold_stream, args=(port, accepted, stop), daemon=True)
+                       for _ in range(args.streams)]
+            for thread in streams:
+                thread.start()
+            time.sleep(1)  # Let the streams connect before measuring
+
+            latencies, errors = [], []
+            workers = [threading.Thread(target=work, args=(port, paths, latencies, errors, stop), daemon=True)
+                       for _ in range(args.workers)]
+            start = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            time.sleep(args.duration)
+            stop.set()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            # Time a SIGTERM shutdown with the streams still open
+            stop_start = time.perf_counter()
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+                stop_time = time.perf_counter() - stop_start
+            except subprocess.TimeoutExpired:
+                stop_time = float('nan')
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return {
+        'streams': sum(accepted),
+        'requests_per_second': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'errors': len(errors),
+        'shutdown': stop_time,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the web service with concurrent clients')
+    parser.add_argument('--modes', nargs='*', default=['dev', 'serve'], choices=['dev', 'serve'], help='Servers to test (default: both)')
+    parser.add_argument('--streams', type=int, default=20, help='/events streams held open (default: 20)')
+    parser.add_argument('--workers', type=int, default=8, help='Threads issuing requests (default: 8)')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load per server (default: 10)')
+    parser.add_argument('--images', type=int, default=12, help='Synthetic uploads (default: 12)')
+    parser.add_argument('--image-size', type=parse_size, default=(1920, 1080), help='Upload size as WIDTHxHEIGHT (default: 1920x1080)')
+    parser.add_argument('--threads', type=int, default=24, help='Worker threads for --serve (default: 24)')
+    args = parser.parse_args()
+
+    print(f"{args.streams} streams, {args.workers} workers, {args.duration:g}s per server; latency in ms")
+    print(f"{'server':<8}{'streams':>8}{'req/s':>10}{'p50':>8}{'p95':>8}{'p99':>8}{'errors':>8}{'stop s':>8}")
+    for mode in args.modes:
+        r = run(mode, args)
+        print(f"{mode:<8}{r['streams']:>8}{r['requests_per_second']:>10.1f}{r['p50']:>8.1f}{r['p95']:>8.1f}"
+              f"{r['p99']:>8.1f}{r['errors']:>8}{r['shutdown']:>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Frame-time benchmark for the slideshow transitions
+
+Runs every transition in display_image.VALID_TRANSITIONS headless under SDL's
+dummy video driver at one or more panel sizes and compares the original
+per-frame *_surface functions with TransitionRenderer on each blend backend
+and with TextureRenderer ("gpu", on SDL's software renderer when headless).
+
+For each combination it reports achieved fps and frame-time percentiles,
+then repeats the frames with tracemalloc on to count memory allocated per
+frame. tracemalloc sees Python objects and numpy buffers but not the pixel
+buffers SDL allocates for new surfaces, so fresh memory is also measured as
+minor page faults per frame. Peak RSS is reported per panel size. --json
+writes everything in machine-readable form for comparing devices.
+
+    python benchmarks/transitions.py --sizes 720p 1080p 4k --frames 60 --json transitions.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+import display_image
+from common import parse_size, percentile, make_image
+
+def legacy_frame(screen, transition, surface1, surface2, progress):
+    """One frame the way display_slideshow rendered it before TransitionRenderer"""
+    if transition == "fade":
+        frame = display_image.fade_surface(surface1, surface2, progress)
+    elif transition == "fade-black":
+        frame = display_image.fade_to_black(surface1, surface2, progress)
+    elif transition.startswith("slide-"):
+        frame = display_image.slide_surface(surface1, surface2, progress, direction=transition)
+    elif transition in ("zoom-in", "zoom-out"):
+        frame = display_image.zoom_surface(surface1, surface2, progress, zoom_in=transition == "zoom-in")
+    elif transition in ("rotate-cw", "rotate-ccw"):
+        frame = display_image.rotate_surface(surface1, surface2, progress, clockwise=transition == "rotate-cw")
+    else:
+        frame = surface2.copy()
+    screen.fill((0, 0, 0))
+    screen.blit(frame, (0, 0))
+
+def make_slide(screen, seed):
+    """Screen-sized slide in the screen's pixel format"""
+    size = screen.get_size()
+    return pygame.image.frombuffer(make_image(size, seed).tobytes(), size, 'RGB').convert(screen)
+
+PAGE_KB = os.sysconf('SC_PAGE_SIZE') / 1024
+
+def measure(draw, frames, present=pygame.display.flip):
+    """Frame times and allocations for draw(progress) followed by present()"""
+    draw(0)  # Warm up lazily created buffers so they are not counted against every frame
+    times = []
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+    start = time.perf_counter()
+    for i in range(frames):
+        frame_start = time.perf_counter()
+        draw(i / frames)
+        present()
+        times.append(time.perf_counter() - frame_start)
+    elapsed = time.perf_counter() - start
+    faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt - faults
+
+    # Second pass under tracemalloc, which slows frames down too much to time them
+    allocated = 0
+    tracemalloc.start()
+    for i in range(frames):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        draw(i / frames)
+        present()
+        allocated += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    return {
+        'fps': frames / elapsed,
+        'p50_ms': percentile(times, 50) * 1000,
+        'p95_ms': percentile(times, 95) * 1000,
+        'p99_ms': percentile(times, 99) * 1000,
+        'max_ms': max(times) * 1000,
+        'traced_kb_per_frame': allocated / frames / 1024,
+        'fault_kb_per_frame': faults * PAGE_KB / frames,
+    }
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark slideshow transitions')
+    parser.add_argument('--sizes', type=parse_size, nargs='*', default=[(1920, 1080)],
+                        help='Screen sizes as WIDTHxHEIGHT or 720p, 1080p, 4k (default: 1080p)')
+    parser.add_argument('--frames', type=int, default=60, help='Frames rendered per transition (default: 60)')
+    parser.add_argument('--transitions', nargs='*', default=display_image.VALID_TRANSITIONS, help='Transitions to run (default: all)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    pygame.init()
+    results = []
+    for size in args.sizes:
+        screen = pygame.display.set_mode(size)
+        surface1 = make_slide(screen, 1)
+        surface2 = make_slide(screen, 2)
+
+        renderers = {'legacy': None}
+        for backend in display_image.BLEND_BACKENDS:
+            renderer = display_image.TransitionRenderer(screen, backend)
+            if renderer.blend_backend == backend:
+                renderers[backend] = renderer
+        if display_image.sdl2_video is not None:
+            # A second window; the software renderer stands in for a GPU under the dummy driver
+            renderers['gpu'] = display_image.TextureRenderer(size)
+
+        print(f"{size[0]}x{size[1]}, {args.frames} frames per transition; frame times in ms, allocations in KB/frame")
+        print(f"{'transition':<12}{'renderer':<8}{'fps':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'traced':>9}{'faults':>9}")
+        for transition in args.transitions:
+            for name, renderer in renderers.items():
+                present = pygame.display.flip
+                if renderer is None:
+                    draw = lambda p: legacy_frame(screen, transition, surface1, surface2, p)
+                else:
+                    draw = lambda p: renderer.draw(transition, surface1, surface2, p)
+                    if name == 'gpu':
+                        present = renderer.present  # The texture renderer's window, not the software screen
+                r = measure(draw, args.frames, present)
+                print(f"{transition:<12}{name:<8}{r['fps']:>8.1f}{r['p50_ms']:>8.2f}{r['p95_ms']:>8.2f}"
+                      f"{r['p99_ms']:>8.2f}{r['traced_kb_per_frame']:>9.1f}{r['fault_kb_per_frame']:>9.1f}")
+                results.append(dict(r, width=size[0], height=size[1], transition=transition, renderer=name))
+        print(f"Peak RSS {peak_rss_mb():.1f} MB")
+        print()
+        for result in results:
+            result.setdefault('peak_rss_mb', peak_rss_mb())  # Peak so far, i.e. for this and smaller sizes
+
+    pygame.quit()
+
+    if args.json:
+        report = {
+            'config': {'sizes': [list(size) for size in args.sizes], 'frames': args.frames},
+            'platform': {'machine': platform.machine(), 'python': platform.python_version(),
+                         'pygame': pygame.version.ver, 'sdl': '.'.join(map(str, pygame.get_sdl_version())),
+                         'cpus': os.cpu_count()},
+            'results': results,
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.json}")
+
+if __name__ == '__main__':
+    main()
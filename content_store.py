@@ -0,0 +1,111 @@
+"""Content-addressed storage for uploads
+
+Every distinct file is stored once as objects/<sha256><ext>, and each
+upload name in the uploads folder is a hard link to its object. Identical
+uploads therefore share one copy on disk while every name keeps working as
+an ordinary path for the display, the thumbnailer and /uploads/. The link
+count is the reference count: an object whose only link is its own entry
+here is no longer used by any name. Hold lock from storing or finding an
+object until a name links to it, so release() cannot delete it in between.
+
+On filesystems without hard links (e.g. FAT on a USB stick) names fall back
+to plain copies and deduplication only applies to the caches.
+"""
+import os
+import shutil
+import threading
+
+OBJECT_FOLDER = 'objects'
+
+lock = threading.RLock()  # Guards the link count between store() and link()
+
+def object_path(content_hash, ext):
+    return os.path.join(OBJECT_FOLDER, f"{content_hash}{ext.lower()}")
+
+def find_object(content_hash):
+    """Path of the stored object for a hash, whatever its extension, or None"""
+    try:
+        for name in os.listdir(OBJECT_FOLDER):
+            if os.path.splitext(name)[0] == content_hash:
+                return os.path.join(OBJECT_FOLDER, name)
+    except OSError:
+        pass
+    return None
+
+def link(source, dest):
+    """Point dest at source's bytes, replacing dest; copies if hard links are unsupported"""
+    tmp_path = f"{dest}.{os.getpid()}.link"
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, dest)
+
+def same_file(a, b):
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+def store(source, content_hash, ext):
+    """Move a new file into the store, or drop it if the object exists; returns the object path"""
+    os.makedirs(OBJECT_FOLDER, exist_ok=True)
+    existing = find_object(content_hash)
+    if existing:
+        os.remove(source)
+        return existing
+    path = object_path(content_hash, ext)
+    os.replace(source, path)
+    return path
+
+def adopt(file_path, content_hash):
+    """Bring a file that was not stored here (older uploads, files copied in) into the store
+
+    Returns True if file_path was replaced by a link to an existing copy.
+    """
+    os.makedirs(OBJECT_FOLDER, exist_ok=True)
+    with lock:
+        return _adopt(file_path, content_hash)
+
+def _adopt(file_path, content_hash):
+    existing = find_object(content_hash)
+    if existing is None:
+        path = object_path(content_hash, os.path.splitext(file_path)[1])
+        try:
+            os.link(file_path, path)
+        except OSError:
+            shutil.copyfile(file_path, path)
+        return False
+    if same_file(existing, file_path):
+        return False
+    link(existing, file_path)
+    return True
+
+def release(content_hash):
+    """Delete the object once no upload name links to it; returns True if it is gone"""
+    with lock:
+        path = find_object(content_hash)
+        if path is None:
+            return True
+        try:
+            if os.stat(path).st_nlink > 1:
+                return False
+            os.remove(path)
+        except OSError as e:
+            print(f"Error releasing {path}: {e}")
+            return False
+    return True
+
+def unused(in_use):
+    """Hashes of objects that no upload name links to and that are not in in_use"""
+    hashes = []
+    try:
+        for name in os.listdir(OBJECT_FOLDER):
+            content_hash, ext = os.path.splitext(name)
+            if len(content_hash) != 64 or content_hash in in_use:
+                continue  # Not an object (sources.json, temp files) or still named
+            if os.stat(os.path.join(OBJECT_FOLDER, name)).st_nlink == 1:
+                hashes.append(content_hash)
+    except OSError as e:
+        print(f"Error scanning {OBJECT_FOLDER}: {e}")
+    return hashes
@@ -0,0 +1,107 @@
+"""Control channel between app.py and a running display_image.py
+
+display_image.py listens on a Unix socket and app.py sends it commands as
+newline-delimited JSON, one reply line per request:
+
+    {"command": "set_playlist", "images": ["uploads/a.jpg", ...]}
+    {"command": "set_settings", "delay": 10, "transition": "fade", ...}
+    {"command": "next"} / {"command": "pause"} / {"command": "resume"}
+    {"command": "status"} / {"command": "metrics"} / {"command": "quit"}
+
+Requests are handed to the render thread through a queue, so they are
+applied between frames rather than racing the renderer.
+"""
+import os
+import json
+import socket
+import threading
+from queue import Queue, Empty
+
+CONTROL_SOCKET = os.path.join('cache', 'display.sock')
+REPLY_TIMEOUT = 5.0  # Seconds to wait for the render thread to answer
+
+class ControlServer:
+    """Accepts commands on a Unix socket and queues them for the render thread
+
+    wake is called after each request is queued so a render loop sleeping in
+    pygame.event.wait picks it up immediately.
+    """
+
+    def __init__(self, path=CONTROL_SOCKET, wake=None):
+        self.path = path
+        self.wake = wake
+        self.commands = Queue()
+        self.sock = None
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)  # Stale socket from a previous run
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(8)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        print(f"Listening for display commands on {self.path}")
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return  # Socket closed
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn, conn.makefile('rwb') as stream:
+            for line in stream:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    reply = {'ok': False, 'error': 'Invalid JSON'}
+                else:
+                    reply_queue = Queue(maxsize=1)
+                    self.commands.put((request, reply_queue))
+                    if self.wake:
+                        self.wake()
+                    try:
+                        reply = reply_queue.get(timeout=REPLY_TIMEOUT)
+                    except Empty:
+                        reply = {'ok': False, 'error': 'Display did not respond'}
+                try:
+                    stream.write(json.dumps(reply).encode() + b'\n')
+                    stream.flush()
+                except OSError:
+                    return
+
+    def pending(self):
+        """Yield (request, reply) pairs queued since the last call; call reply(dict) to answer"""
+        while True:
+            try:
+                request, reply_queue = self.commands.get_nowait()
+            except Empty:
+                return
+            yield request, reply_queue.put
+
+    def close(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def send_command(command, path=CONTROL_SOCKET, timeout=REPLY_TIMEOUT, **args):
+    """Send one command to the display process; returns its reply, or None if unreachable"""
+    request = dict(args, command=command)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(json.dumps(request).encode() + b'\n')
+            with sock.makefile('rb') as stream:
+                line = stream.readline()
+        return json.loads(line) if line else None
+    except (OSError, ValueError) as e:
+        print(f"Error sending '{command}' to display: {e}")
+        return None
@@ -1,6 +1,52 @@
+import os
 import sys
+import signal
 import pygame
+import psutil
+from PIL import Image
 import time
+import queue
+import bisect
+import threading
+from collections import deque, OrderedDict
+import render_cache
+import display_control
+
+try:
+    import numpy as np
+except ImportError:  # The numpy blend backend is optional
+    np = None
+
+try:
+    from pygame._sdl2 import video as sdl2_video
+except ImportError:  # pygame built without the SDL2 renderer bindings
+    sdl2_video = None
+
+VALID_TRANSITIONS = [
+    "fade", "fade-black", "slide-left", "slide-right", "slide-up", "slide-down",
+    "zoom-in", "zoom-out", "rotate-cw", "rotate-ccw", "none"
+]
+BLEND_BACKENDS = ["sdl", "numpy"]
+RENDERERS = ["software", "gpu"]
+
+# Transitions rendered ahead of time during the dwell, and how
+PRERENDER_TRANSITIONS = {"zoom-in", "zoom-out", "rotate-cw", "rotate-ccw"}
+PRERENDER_SCALE = 0.5  # Fraction of the screen resolution
+PRERENDER_FPS = 30  # Quantized progress steps per second of transition
+PRERENDER_MIN_FPS = 20  # Below this the sequence would look choppier than rendering live
+PRERENDER_MEMORY_LIMIT = 64 * 1024 * 1024  # Bytes per prerendered sequence
+DECODE_WORKERS = min(4, os.cpu_count() or 1)  # Threads decoding slides in parallel
+TEXTURE_CACHE_SIZE = 3  # Slide textures kept: current, next and one left over from a playlist swap
+SDL_BLENDMODE_BLEND = 1
+ANIMATION_BUFFER_FRAMES = 4  # Decoded frames of an animated slide queued ahead of playback
+DEFAULT_FRAME_MS = 100  # Frame time for GIFs that give none, or too short a one, as browsers do
+MIN_FRAME_MS = 20
+FRAME_BUCKETS_MS = (8, 16.7, 20, 33.3, 50, 100, 250)  # Frame-time histogram bounds for the metrics command
+
+# Posted by the slide loader thread to wake the render loop
+SLIDE_LOADED = pygame.USEREVENT + 1
+# Posted by the control server when a command is queued
+CONTROL_COMMAND = pygame.USEREVENT + 2
 
 def fade_surface(surface1, surface2, progress):
     """Cross-fade between two surfaces"""
@@ -175,47 +221,1244 @@ def fade_to_black(surface1, surface2, progress):
     
     return result
 
-def load_and_scale_image(path, screen_width, screen_height):
-    """Load and scale image with error handling"""
+class NumpyBlender:
+    """Cross-fades as a vectorized integer lerp over pygame.surfarray views
+
+    Works on packed 32-bit pixels, blending the red/blue and green channels
+    in two masked passes so every numpy operation handles a whole pixel.
+    Scratch arrays are allocated once for the screen size.
+    """
+
+    RB_MASK = 0x00FF00FF
+    G_MASK = 0x0000FF00
+
+    def __init__(self, width, height):
+        # Row-major like the surface memory; surfarray views are transposed to match
+        self.rb = np.empty((height, width), dtype=np.uint32)
+        self.g = np.empty((height, width), dtype=np.uint32)
+        self.tmp = np.empty((height, width), dtype=np.uint32)
+
+    @staticmethod
+    def supports(surface):
+        # Color channels must sit in the low three bytes of a 32-bit pixel
+        if surface.get_bitsize() != 32:
+            return False
+        return sorted(surface.get_shifts()[:3]) == [0, 8, 16]
+
+    def _channel(self, out, pa, pb, mask, weight):
+        np.bitwise_and(pa, mask, out=out)
+        np.multiply(out, 256 - weight, out=out)
+        if pb is not None:
+            tmp = self.tmp[:out.shape[0], :out.shape[1]]
+            np.bitwise_and(pb, mask, out=tmp)
+            np.multiply(tmp, weight, out=tmp)
+            np.add(out, tmp, out=out)
+        np.right_shift(out, 8, out=out)
+        np.bitwise_and(out, mask, out=out)
+
+    def lerp(self, dest, surface1, surface2, weight):
+        """dest = surface1 + (surface2 - surface1) * weight; surface2 None blends toward black"""
+        width, height = dest.get_size()
+        w = max(0, min(256, int(weight * 256)))
+        pd = pygame.surfarray.pixels2d(dest).T
+        pa = pygame.surfarray.pixels2d(surface1).T
+        pb = pygame.surfarray.pixels2d(surface2).T if surface2 is not None else None
+        rb = self.rb[:height, :width]
+        g = self.g[:height, :width]
+        self._channel(rb, pa, pb, self.RB_MASK, w)
+        self._channel(g, pa, pb, self.G_MASK, w)
+        np.bitwise_or(rb, g, out=pd)
+        # Views lock their surfaces until released
+        del pd, pa, pb
+
+class TransitionRenderer:
+    """Draws transition frames straight onto the screen without per-frame allocations
+
+    Scratch buffers are allocated once for the screen size and slides are
+    faded by toggling their surface alpha instead of copying them into
+    per-pixel-alpha layers. Only rotation still allocates, since
+    pygame.transform.rotozoom cannot render into an existing surface.
+
+    blend_backend picks how cross-fades are computed: "sdl" blits with
+    surface alpha, "numpy" runs a vectorized lerp over surfarray views. The
+    numpy backend falls back to "sdl" when numpy is missing or the screen
+    format is not packed 32-bit.
+    """
+
+    def __init__(self, screen, blend_backend="sdl"):
+        self.screen = screen
+        self.width, self.height = screen.get_size()
+        # Largest zoomed frame is 130% of the screen; smoothscale renders into views of this buffer
+        self.scale_buffer = pygame.Surface(
+            (int(self.width * 1.3) + 1, int(self.height * 1.3) + 1), 0, screen
+        )
+        self.blender = None
+        self.set_blend_backend(blend_backend)
+
+    def set_blend_backend(self, blend_backend):
+        if blend_backend == "numpy":
+            if np is None:
+                print("numpy is not installed, using sdl blend backend")
+            elif not NumpyBlender.supports(self.screen):
+                print(f"Screen format ({self.screen.get_bitsize()}-bit) unsupported by numpy blend backend, using sdl")
+            else:
+                if self.blender is None:
+                    self.blender = NumpyBlender(self.width, self.height)
+                self.blend_backend = "numpy"
+                return
+        self.blender = None
+        self.blend_backend = "sdl"
+
+    def draw(self, transition, surface1, surface2, progress):
+        """Render one frame of a named transition onto the screen"""
+        if transition == "fade":
+            self.fade(surface1, surface2, progress)
+        elif transition == "fade-black":
+            self.fade_black(surface1, surface2, progress)
+        elif transition.startswith("slide-"):
+            self.slide(surface1, surface2, progress, transition)
+        elif transition == "zoom-in":
+            self.zoom(surface1, surface2, progress, zoom_in=True)
+        elif transition == "zoom-out":
+            self.zoom(surface1, surface2, progress, zoom_in=False)
+        elif transition == "rotate-cw":
+            self.rotate(surface1, surface2, progress, clockwise=True)
+        elif transition == "rotate-ccw":
+            self.rotate(surface1, surface2, progress, clockwise=False)
+        else:
+            self.screen.blit(surface2, (0, 0))
+
+    def show(self, surface):
+        """Draw a slide as the whole frame"""
+        self.screen.blit(surface, (0, 0))
+
+    def show_frame(self, surface):
+        """Draw one frame of an animated slide"""
+        self.show(surface)
+
+    def blit_alpha(self, surface, alpha, position=(0, 0)):
+        """Blit with a temporary surface alpha, leaving the slide untouched afterwards"""
+        surface.set_alpha(alpha)
+        self.screen.blit(surface, position)
+        surface.set_alpha(None)
+
+    def fade_in(self, surface, progress):
+        """Fade a slide in from black"""
+        self.screen.fill((0, 0, 0))
+        self.blit_alpha(surface, int(255 * progress))
+
+    def fade(self, surface1, surface2, progress):
+        if self.blender:
+            self.blender.lerp(self.screen, surface1, surface2, progress)
+            return
+        self.screen.blit(surface1, (0, 0))
+        self.blit_alpha(surface2, int(255 * progress))
+
+    def fade_black(self, surface1, surface2, progress):
+        if self.blender:
+            if progress < 0.5:
+                self.blender.lerp(self.screen, surface1, None, progress * 2)
+            else:
+                self.blender.lerp(self.screen, surface2, None, 1 - (progress - 0.5) * 2)
+            return
+        self.screen.fill((0, 0, 0))
+        if progress < 0.5:
+            self.blit_alpha(surface1, int(255 * (1 - progress * 2)))
+        else:
+            self.blit_alpha(surface2, int(255 * ((progress - 0.5) * 2)))
+
+    def slide(self, surface1, surface2, progress, direction):
+        # Both slides are screen sized, so together they always cover the whole frame
+        if direction == "slide-left":
+            offset = int(self.width * progress)
+            self.screen.blit(surface1, (-offset, 0))
+            self.screen.blit(surface2, (self.width - offset, 0))
+        elif direction == "slide-right":
+            offset = int(self.width * progress)
+            self.screen.blit(surface1, (offset, 0))
+            self.screen.blit(surface2, (-self.width + offset, 0))
+        elif direction == "slide-up":
+            offset = int(self.height * progress)
+            self.screen.blit(surface1, (0, -offset))
+            self.screen.blit(surface2, (0, self.height - offset))
+        elif direction == "slide-down":
+            offset = int(self.height * progress)
+            self.screen.blit(surface1, (0, offset))
+            self.screen.blit(surface2, (0, -self.height + offset))
+
+    def scaled(self, surface, scale):
+        """Smoothscale into a view of the shared buffer instead of a new surface"""
+        size = (int(self.width * scale), int(self.height * scale))
+        view = self.scale_buffer.subsurface((0, 0) + size)
+        pygame.transform.smoothscale(surface, size, view)
+        return view
+
+    def zoom(self, surface1, surface2, progress, zoom_in=True):
+        if zoom_in and self.blender:
+            # The grown first image covers the whole screen, so this is a plain cross-fade
+            scaled = self.scaled(surface1, 1 + (progress * 0.3))
+            self.blender.lerp(self.screen, scaled.subsurface((0, 0, self.width, self.height)), surface2, progress)
+        elif zoom_in:
+            # First image grows while the second fades in over it
+            self.screen.blit(self.scaled(surface1, 1 + (progress * 0.3)), (0, 0))
+            self.blit_alpha(surface2, int(255 * progress))
+        else:
+            # Second image zooms out from center
+            scaled = self.scaled(surface2, 0.7 + (progress * 0.3))
+            x = (self.width - scaled.get_width()) // 2
+            y = (self.height - scaled.get_height()) // 2
+            if self.blender:
+                self.blender.lerp(self.screen, surface1, None, progress)
+                area = self.screen.subsurface((x, y) + scaled.get_size())
+                self.blender.lerp(area, area, scaled, progress)
+                return
+            self.screen.fill((0, 0, 0))
+            self.blit_alpha(surface1, int(255 * (1 - progress)))
+            self.blit_alpha(scaled, int(255 * progress), (x, y))
+
+    def rotate(self, surface1, surface2, progress, clockwise=True):
+        angle = 180 * progress if clockwise else -180 * progress
+        rotated1 = pygame.transform.rotozoom(surface1, angle, 1)
+        rotated2 = pygame.transform.rotozoom(surface2, angle - 180 if clockwise else angle + 180, 1)
+
+        self.screen.fill((0, 0, 0))
+        for rotated, alpha in ((rotated1, 1 - progress), (rotated2, progress)):
+            x = (self.width - rotated.get_width()) // 2
+            y = (self.height - rotated.get_height()) // 2
+            rotated.set_alpha(int(255 * alpha))
+            self.screen.blit(rotated, (x, y))
+
+class TextureRenderer:
+    """Draws transition frames with SDL's 2D renderer instead of on a software screen
+
+    Each slide is uploaded once as a texture and every frame only changes
+    texture alpha, position, size and angle, so blending, scaling and
+    rotation run on the GPU (the VideoCore on a Pi). With no GPU, SDL picks
+    its software renderer and the same code still works, e.g. under the
+    dummy video driver. Frames match TransitionRenderer's sdl backend.
+
+    The renderer owns the fullscreen window, so anything drawn on an
+    ordinary surface (the loading animation) is shown with present_canvas.
+    """
+
+    blend_backend = "gpu"
+
+    def __init__(self, size=None):
+        # Fullscreen at the panel's resolution unless a window size is given (benchmarks)
+        if size:
+            self.window = sdl2_video.Window("PiMenu", size=size)
+        else:
+            self.window = sdl2_video.Window("PiMenu", fullscreen_desktop=True)
+        self.renderer = sdl2_video.Renderer(self.window, accelerated=-1, vsync=True)
+        self.width, self.height = self.size = self.window.size
+        self.textures = OrderedDict()  # id(surface) -> (surface, texture), least recently used first
+        self.canvas = None
+        self.frame_texture = None
+
+    def set_blend_backend(self, blend_backend):
+        pass  # Blending is always done by the renderer
+
+    def texture(self, surface):
+        """Texture for a slide, uploaded on first use"""
+        entry = self.textures.pop(id(surface), None)
+        if entry is None:
+            texture = sdl2_video.Texture.from_surface(self.renderer, surface)
+            texture.blend_mode = SDL_BLENDMODE_BLEND  # Needed for alpha on opaque slides
+            entry = (surface, texture)  # Holding the surface keeps its id from being reused
+        self.textures[id(surface)] = entry
+        while len(self.textures) > TEXTURE_CACHE_SIZE:
+            self.textures.popitem(last=False)
+        return entry[1]
+
+    def blit(self, surface, alpha=255, rect=None, angle=0):
+        texture = self.texture(surface)
+        texture.alpha = alpha
+        texture.draw(dstrect=rect, angle=angle)
+
+    def clear(self):
+        self.renderer.draw_color = (0, 0, 0, 255)
+        self.renderer.clear()
+
+    def draw(self, transition, surface1, surface2, progress):
+        """Render one frame of a named transition"""
+        self.clear()
+        if transition == "fade":
+            self.blit(surface1)
+            self.blit(surface2, int(255 * progress))
+        elif transition == "fade-black":
+            if progress < 0.5:
+                self.blit(surface1, int(255 * (1 - progress * 2)))
+            else:
+                self.blit(surface2, int(255 * ((progress - 0.5) * 2)))
+        elif transition.startswith("slide-"):
+            self.slide(surface1, surface2, progress, transition)
+        elif transition == "zoom-in":
+            # First image grows from the top left while the second fades in over it
+            scale = 1 + progress * 0.3
+            self.blit(surface1, rect=(0, 0, int(self.width * scale), int(self.height * scale)))
+            self.blit(surface2, int(255 * progress))
+        elif transition == "zoom-out":
+            # Second image zooms out from center
+            width, height = int(self.width * (0.7 + progress * 0.3)), int(self.height * (0.7 + progress * 0.3))
+            self.blit(surface1, int(255 * (1 - progress)))
+            self.blit(surface2, int(255 * progress), ((self.width - width) // 2, (self.height - height) // 2, width, height))
+        elif transition in ("rotate-cw", "rotate-ccw"):
+            # Same angles as pygame.transform.rotozoom, which turns counterclockwise; SDL turns clockwise
+            clockwise = transition == "rotate-cw"
+            angle = 180 * progress if clockwise else -180 * progress
+            self.blit(surface1, int(255 * (1 - progress)), angle=-angle)
+            self.blit(surface2, int(255 * progress), angle=-(angle - 180 if clockwise else angle + 180))
+        else:
+            self.blit(surface2)
+
+    def slide(self, surface1, surface2, progress, direction):
+        if direction in ("slide-left", "slide-right"):
+            offset = int(self.width * progress)
+            sign = -1 if direction == "slide-left" else 1
+            self.blit(surface1, rect=(sign * offset, 0, self.width, self.height))
+            self.blit(surface2, rect=(sign * (offset - self.width), 0, self.width, self.height))
+        else:
+            offset = int(self.height * progress)
+            sign = -1 if direction == "slide-up" else 1
+            self.blit(surface1, rect=(0, sign * offset, self.width, self.height))
+            self.blit(surface2, rect=(0, sign * (offset - self.height), self.width, self.height))
+
+    def fade_in(self, surface, progress):
+        """Fade a slide in from black"""
+        self.clear()
+        self.blit(surface, int(255 * progress))
+
+    def show(self, surface):
+        """Draw a slide as the whole frame"""
+        self.blit(surface)
+
+    def show_frame(self, surface):
+        """Draw one frame of an animated slide through a single streaming texture
+
+        Frames are used once, so uploading each as its own texture would only
+        push the current and next slides out of the texture cache.
+        """
+        if self.frame_texture is None:
+            self.frame_texture = sdl2_video.Texture(self.renderer, self.size, streaming=True)
+        self.frame_texture.update(surface)
+        self.clear()
+        self.frame_texture.draw()
+
+    def present(self):
+        self.renderer.present()
+
+    def present_canvas(self, canvas):
+        """Show a frame drawn in software on canvas"""
+        if self.canvas is None:
+            self.canvas = sdl2_video.Texture(self.renderer, canvas.get_size(), streaming=True)
+        self.canvas.update(canvas)
+        self.canvas.draw()
+        self.renderer.present()
+
+def open_texture_renderer():
+    """A TextureRenderer for the display, or None when SDL cannot create one"""
+    if sdl2_video is None:
+        print("pygame has no SDL2 renderer support, using software renderer")
+        return None
     try:
-        img = pygame.image.load(path).convert()  # Convert for faster blitting
-        img_width = img.get_width()
-        img_height = img.get_height()
-        aspect_ratio = img_width / img_height
-        
-        if screen_width / screen_height > aspect_ratio:
-            new_height = screen_height
-            new_width = int(new_height * aspect_ratio)
+        return TextureRenderer()
+    except RuntimeError as e:  # pygame.error and the SDL2 bindings' own error both derive from it
+        print(f"GPU renderer unavailable ({e}), using software renderer")
+        return None
+
+def display_format(surface, alpha=False):
+    """Convert a surface to the screen's format for fast blits; textures take any format"""
+    if pygame.display.get_surface() is None:
+        return surface  # The GPU renderer owns the window and there is no screen surface
+    return surface.convert_alpha() if alpha else surface.convert()
+
+class TransitionPrerenderer:
+    """Renders the expensive geometric transitions ahead of time during the dwell
+
+    Rotate and zoom frames are rendered in a background thread at a fixed
+    number of quantized progress steps, so playback only copies or smoothly
+    scales a finished frame onto the screen. A sequence never exceeds
+    memory_limit bytes: it is rendered at full resolution when that fits,
+    else at the reduced scale, and not at all when even that would leave
+    fewer than min_fps steps per second, since the live renderer looks better.
+    """
+
+    def __init__(self, screen, scale=PRERENDER_SCALE, memory_limit=PRERENDER_MEMORY_LIMIT, fps=PRERENDER_FPS, min_fps=PRERENDER_MIN_FPS):
+        self.screen = screen
+        width, height = screen.get_size()
+        self.sizes = [(width, height), (max(1, int(width * scale)), max(1, int(height * scale)))]
+        self.memory_limit = memory_limit
+        self.fps = fps
+        self.min_fps = min_fps
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.frames = []
+        self.pair = None
+        self.transition = None
+        self.memory_bytes = 0
+
+    def prepare(self, transition, duration, surface1, surface2):
+        """Start rendering the transition between two slides in the background
+
+        Must be called from the render thread: the slides are downscaled or
+        copied here so the worker only ever touches its own surfaces.
+        """
+        self.release()
+        if transition not in PRERENDER_TRANSITIONS:
+            return
+
+        wanted = max(2, int(duration * self.fps))
+        needed = max(2, int(duration * self.min_fps))
+        for size in self.sizes:
+            steps = min(wanted, self.memory_limit // (size[0] * size[1] * self.screen.get_bytesize()))
+            if steps >= needed:
+                break
         else:
-            new_width = screen_width
-            new_height = int(new_width / aspect_ratio)
-        
-        scaled_img = pygame.transform.smoothscale(img, (new_width, new_height))
-        
-        # Create display surface
-        display_surface = pygame.Surface((screen_width, screen_height))
-        display_surface.fill((0, 0, 0))
-        x = (screen_width - new_width) // 2
-        y = (screen_height - new_height) // 2
-        display_surface.blit(scaled_img, (x, y))
-        
-        return display_surface
+            print(f"Prerender memory limit too small for {duration:g}s of {transition}, rendering live")
+            return
+
+        pair = (surface1, surface2)
+        if size == self.screen.get_size():
+            small1, small2 = surface1.copy(), surface2.copy()
+        else:
+            small1 = pygame.transform.smoothscale(surface1, size)
+            small2 = pygame.transform.smoothscale(surface2, size)
+        with self.lock:
+            generation = self.generation
+        threading.Thread(
+            target=self._render,
+            args=(generation, transition, pair, small1, small2, size, steps),
+            daemon=True
+        ).start()
+
+    def _render(self, generation, transition, pair, small1, small2, size, steps):
+        try:
+            start = time.perf_counter()
+            target = pygame.Surface(size, 0, self.screen)
+            renderer = TransitionRenderer(target)
+
+            frames = []
+            for step in range(steps):
+                if generation != self.generation:
+                    return  # Superseded by a newer slide pair
+                renderer.draw(transition, small1, small2, step / (steps - 1))
+                frames.append(target.copy())
+
+            memory_bytes = len(frames) * size[0] * size[1] * self.screen.get_bytesize()
+            with self.lock:
+                if generation != self.generation:
+                    return
+                self.frames = frames
+                self.pair = pair
+                self.transition = transition
+                self.memory_bytes = memory_bytes
+            print(
+                f"Prerendered {steps} {transition} frames at {size[0]}x{size[1]} "
+                f"({memory_bytes / 1048576:.1f} MB) in {time.perf_counter() - start:.2f}s"
+            )
+        except Exception as e:
+            print(f"Error prerendering {transition}: {e}")
+
+    def draw(self, transition, surface1, surface2, progress):
+        """Present the prerendered frame for progress; False if no matching sequence is ready"""
+        with self.lock:
+            frames = self.frames
+            matches = (
+                self.transition == transition
+                and self.pair is not None
+                and self.pair[0] is surface1
+                and self.pair[1] is surface2
+            )
+        if not matches or not frames:
+            return False
+        frame = frames[min(len(frames) - 1, int(round(progress * (len(frames) - 1))))]
+        if frame.get_size() == self.screen.get_size():
+            self.screen.blit(frame, (0, 0))
+        else:
+            pygame.transform.smoothscale(frame, self.screen.get_size(), self.screen)
+        return True
+
+    def release(self):
+        """Drop the current sequence and cancel any render still in flight"""
+        with self.lock:
+            self.generation += 1
+            self.frames = []
+            self.pair = None
+            self.transition = None
+            self.memory_bytes = 0
+
+def load_cached_render(content_hash, screen_width, screen_height):
+    """Load a pre-scaled raw RGB render written by app.py, or None on a miss"""
+    render_path = render_cache.render_path(content_hash, (screen_width, screen_height))
+    try:
+        with open(render_path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) != screen_width * screen_height * 3:
+        print(f"Ignoring truncated render {render_path}")
+        return None
+    return display_format(pygame.image.frombuffer(data, (screen_width, screen_height), 'RGB'))
+
+def store_render(content_hash, size, data):
+    """Write a render back to the render cache so the next start skips the decode"""
+    try:
+        render_cache.write_atomic(render_cache.render_path(content_hash, size), data)
+    except Exception as e:
+        print(f"Error caching render: {e}")
+
+def load_and_scale_image(path, screen_width, screen_height, manifest=None):
+    """Load and scale image with error handling, preferring a cached render
+
+    Decoding and scaling run in Pillow, which releases the GIL, so slide
+    loader threads work in parallel; pygame only wraps the finished bytes.
+    """
+    content_hash = render_cache.lookup_hash(path, manifest)
+    if content_hash:
+        cached = load_cached_render(content_hash, screen_width, screen_height)
+        if cached:
+            return cached
+
+    try:
+        size = (screen_width, screen_height)
+        with Image.open(path) as img:
+            data = render_cache.letterbox(img, size)
+        if content_hash:
+            store_render(content_hash, size, data)
+        # frombuffer shares the bytes; display_format then converts once for fast blits
+        return display_format(pygame.image.frombuffer(data, size, 'RGB'))
     except Exception as e:
         print(f"Error loading image {path}: {e}")
         return None
 
-def display_slideshow(image_paths, delay=3, transition="fade", transition_duration=3.0):
+class AnimatedSlide:
+    """An animated GIF, APNG or WebP played frame by frame during its dwell
+
+    Only the first frame is kept decoded; it is what transitions and the
+    slide window hold. While the slide is on screen a decoder thread streams
+    letterboxed frames into a queue of ANIMATION_BUFFER_FRAMES, so memory
+    stays at a few frames however long the clip is. Frames are numbered
+    across loops and frame() picks the one due at the elapsed time, dropping
+    any the decoder delivered too late rather than slowing the clip down.
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        with Image.open(path) as img:
+            self.frame_count = img.n_frames
+            data = render_cache.letterbox(img, size)
+            # Reading every frame's duration means seeking through the clip once, without keeping frames
+            durations = []
+            for index in range(self.frame_count):
+                img.seek(index)
+                duration = img.info.get('duration') or 0
+                durations.append((duration if duration >= MIN_FRAME_MS else DEFAULT_FRAME_MS) / 1000)
+        self.first = display_format(pygame.image.frombuffer(data, size, 'RGB'))
+        self.starts = [sum(durations[:index]) for index in range(self.frame_count)]
+        self.loop_seconds = sum(durations)
+        self.frames = queue.Queue(maxsize=ANIMATION_BUFFER_FRAMES)
+        self.generation = 0
+        self.lookahead = None  # Next decoded (generation, sequence, surface), held until it is due
+        self.current = self.first
+        self.current_sequence = 0
+        self.dropped = 0
+        self.lag_frames = 0  # How far the frame on screen trailed the one due at the last frame() call
+
+    def dwell(self, delay):
+        """Time on screen: whole loops of the clip, at least delay"""
+        loops = max(1, -(-delay // self.loop_seconds)) if self.loop_seconds else 1
+        return loops * self.loop_seconds
+
+    def start(self):
+        """Play from the first frame, e.g. when the slide comes on screen"""
+        self.stop()
+        self.current = self.first
+        self.current_sequence = 0
+        threading.Thread(target=self._decode_loop, args=(self.generation,), daemon=True).start()
+
+    def stop(self):
+        """Stop the decoder and drop buffered frames"""
+        self.generation += 1
+        self.lookahead = None
+        while True:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                break
+
+    def _decode_loop(self, generation):
+        sequence = 1  # The first frame is already decoded
+        try:
+            with Image.open(self.path) as img:
+                while self.generation == generation:
+                    img.seek(sequence % self.frame_count)
+                    data = render_cache.letterbox(img, self.size)
+                    frame = (generation, sequence, display_format(pygame.image.frombuffer(data, self.size, 'RGB')))
+                    # Blocks while the buffer is full, checking now and then whether playback stopped
+                    while self.generation == generation:
+                        try:
+                            self.frames.put(frame, timeout=0.5)
+                            break
+                        except queue.Full:
+                            pass
+                    sequence += 1
+        except Exception as e:
+            print(f"Error decoding animation {self.path}: {e}")
+
+    def frame(self, elapsed):
+        """(surface due elapsed seconds into playback, seconds until the next frame is due)"""
+        loop, offset = divmod(elapsed, self.loop_seconds)
+        index = bisect.bisect_right(self.starts, offset) - 1
+        target = int(loop) * self.frame_count + index
+        while True:
+            if self.lookahead is None:
+                try:
+                    self.lookahead = self.frames.get_nowait()
+                except queue.Empty:
+                    break
+            generation, sequence, surface = self.lookahead
+            if generation != self.generation:
+                self.lookahead = None  # Put by a decoder that was stopped after the queue was drained
+                continue
+            if sequence > target:
+                break
+            if sequence < target:
+                self.dropped += 1
+            self.current_sequence, self.current = sequence, surface
+            self.lookahead = None
+        next_start = self.starts[index + 1] if index + 1 < self.frame_count else self.loop_seconds
+        wait = next_start - offset
+        self.lag_frames = max(0, target - self.current_sequence)
+        if self.lag_frames:
+            wait = min(wait, 0.005)  # The decoder is behind; poll until the due frame arrives
+        return self.current, wait
+
+def is_animated(path):
+    """True for a multi-frame GIF, APNG or WebP; reads the header only"""
+    try:
+        with Image.open(path) as img:
+            return getattr(img, 'is_animated', False)
+    except Exception:
+        return False
+
+def load_slide(path, screen_width, screen_height, manifest=None):
+    """(first frame surface, AnimatedSlide or None) for a slide; the surface is None on failure"""
+    if is_animated(path):
+        try:
+            animation = AnimatedSlide(path, (screen_width, screen_height))
+            return animation.first, animation
+        except Exception as e:
+            print(f"Error loading animation {path}: {e}, showing it as a still")
+    return load_and_scale_image(path, screen_width, screen_height, manifest), None
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sequence, or 0.0 when empty"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+class FrameStats:
+    """Frame timing and CPU use of the render loop, split by phase
+
+    Phases are 'loading', 'transition' and 'dwell'. Frame times are only
+    recorded between consecutive frames of the same phase, so the dwell
+    phase reports how few frames it presents rather than its long gaps.
+    """
+
+    def __init__(self, report_interval=60):
+        self.report_interval = report_interval
+        self.phases = {}
+        self.phase = None
+        self.phase_wall_start = 0.0
+        self.phase_cpu_start = 0.0
+        self.last_frame = None
+        self.last_report = time.time()
+
+    def _totals(self, phase):
+        if phase not in self.phases:
+            self.phases[phase] = {
+                'frames': 0,
+                'wall_seconds': 0.0,
+                'cpu_seconds': 0.0,
+                'frame_times': deque(maxlen=600),
+                'buckets': [0] * (len(FRAME_BUCKETS_MS) + 1),  # Last one counts everything slower
+                'frame_seconds': 0.0,
+            }
+        return self.phases[phase]
+
+    def _close_phase(self):
+        if self.phase is None:
+            return
+        totals = self._totals(self.phase)
+        totals['wall_seconds'] += time.perf_counter() - self.phase_wall_start
+        totals['cpu_seconds'] += time.process_time() - self.phase_cpu_start
+
+    def enter(self, phase):
+        if phase == self.phase:
+            return
+        self._close_phase()
+        self.phase = phase
+        self.phase_wall_start = time.perf_counter()
+        self.phase_cpu_start = time.process_time()
+        self.last_frame = None
+
+    def frame(self):
+        """Record that a frame was presented in the current phase"""
+        now = time.perf_counter()
+        totals = self._totals(self.phase)
+        totals['frames'] += 1
+        if self.last_frame is not None:
+            elapsed = now - self.last_frame
+            totals['frame_times'].append(elapsed)
+            totals['frame_seconds'] += elapsed
+            bucket = next((i for i, bound in enumerate(FRAME_BUCKETS_MS) if elapsed * 1000 <= bound), len(FRAME_BUCKETS_MS))
+            totals['buckets'][bucket] += 1
+        self.last_frame = now
+
+    def snapshot(self):
+        # Fold the running phase in without ending it
+        self._close_phase()
+        self.phase_wall_start = time.perf_counter()
+        self.phase_cpu_start = time.process_time()
+
+        summary = {}
+        for phase, totals in self.phases.items():
+            wall = totals['wall_seconds']
+            frame_ms = [t * 1000 for t in totals['frame_times']]
+            summary[phase] = {
+                'frames': totals['frames'],
+                'wall_seconds': round(wall, 3),
+                'cpu_seconds': round(totals['cpu_seconds'], 3),
+                'cpu_percent': round(100 * totals['cpu_seconds'] / wall, 1) if wall else 0.0,
+                'fps': round(totals['frames'] / wall, 2) if wall else 0.0,
+                'frame_ms_p50': round(percentile(frame_ms, 50), 2),
+                'frame_ms_p95': round(percentile(frame_ms, 95), 2),
+                'frame_ms_max': round(max(frame_ms), 2) if frame_ms else 0.0,
+            }
+        return summary
+
+    def histograms(self):
+        """Frame-time counts per FRAME_BUCKETS_MS bucket since start, and their total seconds, by phase"""
+        return {
+            phase: {'buckets': list(totals['buckets']), 'sum_seconds': round(totals['frame_seconds'], 6)}
+            for phase, totals in self.phases.items()
+        }
+
+    def report(self):
+        for phase, summary in self.snapshot().items():
+            print(
+                f"Stats [{phase}]: {summary['frames']} frames, {summary['fps']} fps, "
+                f"cpu {summary['cpu_percent']}%, frame p50 {summary['frame_ms_p50']}ms "
+                f"p95 {summary['frame_ms_p95']}ms max {summary['frame_ms_max']}ms"
+            )
+        self.last_report = time.time()
+
+    def maybe_report(self):
+        if time.time() - self.last_report >= self.report_interval:
+            self.report()
+
+def slide_key(path, manifest=None):
+    """Identity of a slide's content: the hash app.py recorded, else path, size and mtime"""
+    content_hash = render_cache.lookup_hash(path, manifest)
+    if content_hash:
+        return content_hash
+    try:
+        signature = render_cache.file_signature(path)
+    except OSError:
+        return path
+    return f"{path}:{signature['size']}:{signature['mtime_ns']}"
+
+class SlideWindow:
+    """Decoded slides for a playlist, holding only a sliding window in memory
+
+    Background threads (up to `workers`, one slide each) decode the current
+    slide plus `lookahead` upcoming ones and drop everything else, so memory stays bounded and the first
+    frame does not wait for the whole playlist. A lookahead of None keeps
+    every slide decoded, which is the original preload-everything behaviour.
+
+    Animated slides keep their AnimatedSlide in `animations`, under the same
+    index as their first frame in `surfaces`.
+
+    seed maps slide keys (see slide_key) to (surface, animation) pairs decoded
+    by a previous window, so a playlist edit only decodes slides whose content is new.
+    """
+
+    def __init__(self, image_paths, screen_width, screen_height, manifest=None, lookahead=1, seed=None, anchor=0, workers=DECODE_WORKERS):
+        self.image_paths = list(image_paths)
+        self.keys = [slide_key(path, manifest) for path in self.image_paths]
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.manifest = manifest
+        self.lookahead = lookahead
+        self.surfaces = {}
+        self.animations = {}
+        self.failed = set()
+        self.loading = set()  # Indices a loader thread is decoding right now
+        self.load_seconds = {}  # path -> how long its last decode took
+        self.anchor = anchor
+        self.wanted = []
+        self.running = True
+        self.condition = threading.Condition()
+        with self.condition:
+            self._update_wanted()
+            # Reuse slides another window already decoded
+            for index in self.wanted:
+                surface, animation = (seed or {}).get(self.keys[index], (None, None))
+                if surface is not None:
+                    self.surfaces[index] = surface
+                    if animation:
+                        self.animations[index] = animation
+        self.threads = [threading.Thread(target=self._load_loop, daemon=True) for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def _update_wanted(self):
+        """Recompute which slides should be resident; caller holds the condition"""
+        count = len(self.image_paths)
+        limit = count if self.lookahead is None else self.lookahead + 1
+        wanted = []
+        for step in range(count):
+            index = (self.anchor + step) % count
+            if index not in self.failed:
+                wanted.append(index)
+                if len(wanted) >= limit:
+                    break
+        self.wanted = wanted
+
+        # Release slides that fell out of the window
+        for index in list(self.surfaces):
+            if index not in wanted:
+                del self.surfaces[index]
+                self.animations.pop(index, None)
+        self.condition.notify_all()
+
+    def _load_loop(self):
+        while True:
+            with self.condition:
+                index = self._next_to_load()
+                while self.running and index is None:
+                    self.condition.wait()
+                    index = self._next_to_load()
+                if not self.running:
+                    return
+                self.loading.add(index)
+
+            path = self.image_paths[index]
+            print(f"Loading image: {path}")
+            start = time.perf_counter()
+            surface, animation = load_slide(path, self.screen_width, self.screen_height, self.manifest)
+
+            with self.condition:
+                self.loading.discard(index)
+                self.load_seconds[path] = time.perf_counter() - start
+                if surface is None:
+                    self.failed.add(index)
+                    self._update_wanted()
+                elif index in self.wanted:
+                    self.surfaces[index] = surface
+                    if animation:
+                        self.animations[index] = animation
+                    print(f"Successfully loaded image: {path}")
+                self.condition.notify_all()
+
+            try:
+                pygame.event.post(pygame.event.Event(SLIDE_LOADED, index=index))
+            except pygame.error:
+                pass  # Display already shut down
+
+    def _next_to_load(self):
+        """Next slide for a loader thread to decode, or None; caller holds the condition"""
+        for index in self._pending():
+            # Identical uploads under several names are decoded once
+            copy = next((other for other in self.surfaces if self.keys[other] == self.keys[index]), None)
+            if copy is not None:
+                self.surfaces[index] = self.surfaces[copy]
+                if copy in self.animations:
+                    self.animations[index] = self.animations[copy]
+                self.condition.notify_all()
+            elif not any(self.keys[other] == self.keys[index] for other in self.loading):
+                return index
+        return None
+
+    def _pending(self):
+        return [index for index in self.wanted if index not in self.surfaces and index not in self.loading]
+
+    def focus(self, index):
+        """Make index the current slide and start prefetching the ones after it"""
+        with self.condition:
+            self.anchor = index
+            self._update_wanted()
+
+    def get(self, index):
+        """Return the decoded slide, waiting for the loader if it is still in flight"""
+        with self.condition:
+            while self.running and index not in self.surfaces and index not in self.failed:
+                if index not in self.wanted:
+                    self.anchor = index
+                    self._update_wanted()
+                self.condition.wait()
+            return self.surfaces.get(index)
+
+    def request(self, index):
+        """Start loading index now if it is outside the window"""
+        with self.condition:
+            if index not in self.wanted:
+                self.anchor = index
+                self._update_wanted()
+
+    def decoded(self):
+        """Resident slides as (surface, animation) pairs keyed by slide_key"""
+        with self.condition:
+            return {self.keys[index]: (surface, self.animations.get(index)) for index, surface in self.surfaces.items()}
+
+    def animation(self, index):
+        """The AnimatedSlide for index, or None for a still image or one not decoded"""
+        with self.condition:
+            return self.animations.get(index)
+
+    def load_times(self):
+        """Seconds the last decode of each playlist image took"""
+        with self.condition:
+            return {path: round(seconds, 4) for path, seconds in self.load_seconds.items()}
+
+    def decoded_bytes(self):
+        """Pixel memory held by resident slides, counting shared surfaces once"""
+        with self.condition:
+            unique = {id(surface): surface for surface in self.surfaces.values()}
+        return sum(surface.get_pitch() * surface.get_height() for surface in unique.values())
+
+    def is_failed(self, index):
+        with self.condition:
+            return index in self.failed
+
+    def peek(self, index):
+        """Return the decoded slide if it is resident, without waiting"""
+        with self.condition:
+            return self.surfaces.get(index)
+
+    def next_index(self, index):
+        """Index of the slide after index (the first slide for None), skipping ones that failed to load"""
+        with self.condition:
+            count = len(self.image_paths)
+            start = -1 if index is None else index
+            for step in range(1, count + 1):
+                candidate = (start + step) % count
+                if candidate not in self.failed:
+                    return candidate
+            return index
+
+    def first_index(self):
+        with self.condition:
+            return self.wanted[0] if self.wanted else None
+
+    def progress(self):
+        """Fraction of the current window that is decoded"""
+        with self.condition:
+            if not self.wanted:
+                return 1.0
+            return sum(1 for index in self.wanted if index in self.surfaces) / len(self.wanted)
+
+    def available(self):
+        with self.condition:
+            return len(self.image_paths) - len(self.failed)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+def display_slideshow(image_paths, delay=3, transition="fade", transition_duration=3.0, lookahead=1, blend_backend="sdl", control_socket=None, renderer_name="software"):
     pygame.init()
-    screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
-    screen_width, screen_height = screen.get_size()
+    gpu = open_texture_renderer() if renderer_name == "gpu" else None
+    if gpu:
+        screen_width, screen_height = gpu.size
+        screen = pygame.Surface(gpu.size)  # Canvas for the loading animation
+        present_frame = gpu.present
+        present_canvas = lambda: gpu.present_canvas(screen)
+        prerender_transitions = set()  # The GPU draws zooms and rotations live at full quality
+    else:
+        screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        screen_width, screen_height = screen.get_size()
+        present_frame = present_canvas = pygame.display.flip
+        prerender_transitions = PRERENDER_TRANSITIONS
     clock = pygame.time.Clock()
 
+    # Let app.py pre-render uploads for this panel, and read its render manifest once
+    render_cache.record_display_size((screen_width, screen_height))
+    manifest = render_cache.load_json(render_cache.MANIFEST_FILE, {})
+
     # Hide the mouse cursor
     pygame.mouse.set_visible(False)
 
+    # Debug output
+    print(f"Screen size: {screen_width}x{screen_height}")
+    print(f"Loading {len(image_paths)} images...")
+    print(f"Settings: delay={delay}, transition={transition}, transition_duration={transition_duration}, lookahead={lookahead}")
+
+    # Start decoding the first slides while the loading animation runs
+    window = SlideWindow(image_paths, screen_width, screen_height, manifest, lookahead)
+    renderer = gpu or TransitionRenderer(screen, blend_backend)
+    prerenderer = TransitionPrerenderer(screen)
+    stats = FrameStats()
+    process = psutil.Process()
+    started = time.time()
+    switches = 0
+    print(f"Renderer: {'gpu' if gpu else 'software'}, blend backend: {renderer.blend_backend}")
+
+    # Playback state, also changed by control commands
+    current_index = None
+    current_image = None
+    playing = None  # AnimatedSlide of the current slide
+    shown_frame = None
+    animation_frames = 0  # Animation frames presented, and skipped as late, since start
+    animation_dropped = 0
+    next_index = None
+    next_image = None
+    pending_index = None  # Slide to show next instead of the one after current_index
+    deferred_playlist = None  # Playlist received mid-transition
+    last_switch = time.time()
+    is_transitioning = False
+    transition_start = 0
+    paused = False
+    skip_requested = False
+    prerender_pending = False
+    damaged = False  # Set when the window system asks for a repaint
+    running = True
+
+    def request_quit(signum, frame):
+        # SIGTERM from app.py or systemd: leave the loop and shut down like ESC does
+        try:
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+        except pygame.error:
+            pass
+    signal.signal(signal.SIGTERM, request_quit)
+
+    control = None
+    if control_socket:
+        def wake():
+            try:
+                pygame.event.post(pygame.event.Event(CONTROL_COMMAND))
+            except pygame.error:
+                pass  # Display already shut down
+        control = display_control.ControlServer(control_socket, wake)
+        control.start()
+
+    def shutdown():
+        if playing:
+            playing.stop()
+        prerenderer.release()
+        window.stop()
+        stats.report()
+        if control:
+            control.close()
+        # Show the cursor again before quitting
+        pygame.mouse.set_visible(True)
+        pygame.quit()
+
+    def status():
+        return {
+            'ok': True,
+            'playlist': window.image_paths,
+            'current_index': current_index,
+            'current_image': window.image_paths[current_index] if current_index is not None and current_index < len(window.image_paths) else None,
+            'paused': paused,
+            'transitioning': is_transitioning,
+            'settings': {
+                'delay': delay,
+                'transition': transition,
+                'transition_duration': transition_duration,
+                'blend_backend': renderer.blend_backend,
+                'renderer': 'gpu' if gpu else 'software',
+                'lookahead': window.lookahead,
+            },
+            'screen': [screen_width, screen_height],
+            'stats': stats.snapshot(),
+        }
+
+    def metrics():
+        """Health numbers for app.py's /metrics endpoint; cheap enough to poll every few seconds"""
+        return {
+            'ok': True,
+            'current_index': current_index,
+            'slides': len(window.image_paths),
+            'paused': paused,
+            'transitioning': is_transitioning,
+            'switches': switches,
+            'uptime_seconds': round(time.time() - started, 1),
+            'phases': stats.snapshot(),
+            'frame_buckets_ms': list(FRAME_BUCKETS_MS),
+            'frame_histograms': stats.histograms(),
+            'load_seconds': window.load_times(),
+            'decoded_bytes': window.decoded_bytes(),
+            'prerender_bytes': prerenderer.memory_bytes,
+            'animation': {
+                'playing': playing is not None,
+                'frames': playing.frame_count if playing else 0,
+                'loop_seconds': round(playing.loop_seconds, 3) if playing else 0.0,
+                'buffered_frames': playing.frames.qsize() if playing else 0,
+                'lag_frames': playing.lag_frames if playing else 0,
+                'frames_shown': animation_frames,
+                'frames_dropped': animation_dropped,
+            },
+            'rss_bytes': process.memory_info().rss,
+        }
+
+    def apply_command(request):
+        """Apply one control command on the render thread and return the reply"""
+        nonlocal delay, transition, transition_duration, deferred_playlist
+        nonlocal paused, skip_requested, last_switch, prerender_pending, running
+        command = request.get('command')
+
+        if command == 'status':
+            return status()
+
+        if command == 'metrics':
+            return metrics()
+
+        if command == 'set_settings':
+            try:
+                if 'delay' in request:
+                    delay = float(request['delay'])
+                if 'transition_duration' in request:
+                    transition_duration = max(0.01, float(request['transition_duration']))
+            except (TypeError, ValueError):
+                return {'ok': False, 'error': 'Invalid number'}
+            if 'transition' in request:
+                if request['transition'] not in VALID_TRANSITIONS:
+                    return {'ok': False, 'error': f"Invalid transition: {request['transition']}"}
+                transition = request['transition']
+            if request.get('blend_backend') in BLEND_BACKENDS:
+                renderer.set_blend_backend(request['blend_backend'])
+            # The prerendered sequence was for the old transition or duration
+            prerenderer.release()
+            prerender_pending = transition in prerender_transitions
+            print(f"Settings: delay={delay}, transition={transition}, transition_duration={transition_duration}")
+            return {'ok': True}
+
+        if command == 'set_playlist':
+            paths = [path for path in request.get('images', []) if path]
+            if not paths:
+                return {'ok': False, 'error': 'Empty playlist'}
+            if is_transitioning:
+                # Swapped in once the running transition has finished
+                deferred_playlist = paths
+            else:
+                apply_playlist(paths)
+            return {'ok': True}
+
+        if command == 'next':
+            skip_requested = True
+            return {'ok': True}
+
+        if command == 'pause':
+            paused = True
+            return {'ok': True}
+
+        if command == 'resume':
+            paused = False
+            last_switch = time.time()
+            if playing:
+                playing.start()  # The dwell starts over, and the clip with it
+            return {'ok': True}
+
+        if command == 'quit':
+            running = False
+            return {'ok': True}
+
+        return {'ok': False, 'error': f"Unknown command: {command}"}
+
+    def apply_playlist(paths):
+        """Switch to a new playlist at the next slide boundary, keeping decoded slides"""
+        nonlocal window, current_index, pending_index, deferred_playlist, prerender_pending
+        deferred_playlist = None
+        manifest = render_cache.load_json(render_cache.MANIFEST_FILE, {})
+        current_key = window.keys[current_index] if current_index is not None else None
+        keys = [slide_key(path, manifest) for path in paths]
+        position = keys.index(current_key) if current_key in keys else None
+
+        # Anchored on the current slide so it and its successor are reused, not decoded again
+        new_window = SlideWindow(
+            paths, screen_width, screen_height, manifest, window.lookahead,
+            seed=window.decoded(), anchor=position or 0
+        )
+        reused = len(new_window.decoded())
+        new_window.load_seconds.update((path, seconds) for path, seconds in window.load_seconds.items() if path in paths)
+        window.stop()
+        window = new_window
+        prerenderer.release()
+        prerender_pending = transition in prerender_transitions
+
+        if position is not None:
+            # Keep showing the current slide and carry on from its new position
+            current_index = position
+            pending_index = None
+        else:
+            pending_index = window.first_index()
+        print(f"Playlist updated: {len(paths)} images, {reused} reused")
+
+    def process_events(events=None):
+        """Handle pending window and control events; False once the slideshow should stop"""
+        nonlocal damaged, running
+        for event in pygame.event.get() if events is None else events:
+            if event.type == pygame.QUIT or (
+                event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
+            ):
+                running = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                damaged = True
+            elif event.type == CONTROL_COMMAND and control:
+                for request, reply in control.pending():
+                    try:
+                        reply(apply_command(request))
+                    except Exception as e:
+                        print(f"Error handling command {request}: {e}")
+                        reply({'ok': False, 'error': str(e)})
+        return running
+
+    def wait_until(deadline):
+        """Sleep until deadline or the next event instead of spinning; False once stopping"""
+        timeout_ms = int((deadline - time.time()) * 1000)
+        if timeout_ms <= 0:
+            return process_events()
+        event = pygame.event.wait(timeout_ms)
+        events = [] if event.type == pygame.NOEVENT else [event]
+        return process_events(events + pygame.event.get())
+
+    def prepare_next_transition():
+        """Prerender the upcoming transition once the next slide has been decoded"""
+        nonlocal prerender_pending
+        if playing:
+            # The transition starts from whichever frame is on screen, so there is no pair to render ahead
+            prerender_pending = False
+            return
+        upcoming = pending_index if pending_index is not None else window.next_index(current_index)
+        upcoming_image = window.peek(upcoming)
+        if upcoming_image is None or upcoming_image is current_image:
+            return  # Retried when the loader posts SLIDE_LOADED
+        prerenderer.prepare(transition, transition_duration, current_image, upcoming_image)
+        prerender_pending = False
+
+    def play(index):
+        """Start the current slide's animation, if it has one, from its first frame"""
+        nonlocal playing, shown_frame
+        if playing:
+            playing.stop()  # Otherwise its decoder blocks on a full queue forever
+        playing = window.animation(index)
+        shown_frame = None
+        if playing:
+            playing.start()
+
+    def current_delay():
+        """Dwell of the current slide: delay, or whole loops of an animated one"""
+        return playing.dwell(delay) if playing else delay
+
     # Load and setup logo for loading animation
+    logo = None
     try:
-        logo = pygame.image.load('logo_white.png').convert_alpha()
+        logo = display_format(pygame.image.load('logo_white.png'), alpha=True)
         # Scale logo to 1/3 screen height maintaining aspect ratio
         logo_height = screen_height // 4
         aspect_ratio = logo.get_width() / logo.get_height()
@@ -225,9 +1468,17 @@ def display_slideshow(image_paths, delay=3, transition="fade", transition_durati
         # Position logo at screen center
         logo_x = (screen_width - logo_width) // 2
         logo_y = (screen_height - logo_height) // 2
-        
-        # Function to draw loading progress
-        def draw_loading_progress(progress):
+    except Exception as e:
+        print(f"Error loading logo: {e}")
+        # Fallback to simple loading text
+        font = pygame.font.SysFont(None, 48)
+        loading_text = font.render("Loading...", True, (255, 255, 255))
+        text_rect = loading_text.get_rect(center=(screen_width/2, screen_height/2))
+
+    # Function to draw loading progress
+    def draw_loading_progress(progress):
+        screen.fill((0, 0, 0))
+        if logo is not None:
             fill_height = int(logo_height * progress)
             
             # Create a mask for the "filling" effect
@@ -241,51 +1492,24 @@ def display_slideshow(image_paths, delay=3, transition="fade", transition_durati
             # Apply mask to logo
             frame = logo.copy()
             frame.blit(mask, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-            
-            # Draw frame
-            screen.fill((0, 0, 0))
             screen.blit(frame, (logo_x, logo_y))
-            pygame.display.flip()
-            
-            # Handle events
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT or (
-                    event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
-                ):
-                    pygame.quit()
-                    return True
-            return False
+        else:
+            screen.blit(loading_text, text_rect)
+        present_canvas()
+        return process_events()
 
-        # Show initial empty logo
-        draw_loading_progress(0)
-        
-        # Debug output
-        print(f"Screen size: {screen_width}x{screen_height}")
-        print(f"Loading {len(image_paths)} images...")
-        print(f"Settings: delay={delay}, transition={transition}, transition_duration={transition_duration}")
-
-        # Load and scale all images with progress
-        images = []
-        total_images = len(image_paths)
-        
-        for i, path in enumerate(image_paths):
-            try:
-                print(f"Loading image: {path}")
-                img = load_and_scale_image(path, screen_width, screen_height)
-                if img:
-                    images.append(img)
-                    print(f"Successfully loaded image: {path}")
-                
-                # Update loading progress
-                progress = (i + 1) / total_images
-                if draw_loading_progress(progress):
-                    return  # Exit if requested
-                
-                clock.tick(60)  # Keep animation smooth
-                
-            except Exception as e:
-                print(f"Error loading image {path}: {e}")
+    # Wait for the first window of slides, animating the logo as they arrive
+    stats.enter('loading')
+    while True:
+        progress = window.progress()
+        if not draw_loading_progress(progress):
+            return shutdown()  # Exit if requested
+        stats.frame()
+        if progress >= 1.0 or window.available() == 0:
+            break
+        clock.tick(60)  # Keep animation smooth
 
+    if logo is not None:
         # Fade out the logo to black
         fade_duration = 0.5  # Half second fade out
         fade_start = time.time()
@@ -299,184 +1523,166 @@ def display_slideshow(image_paths, delay=3, transition="fade", transition_durati
             # Draw frame
             screen.fill((0, 0, 0))
             screen.blit(frame, (logo_x, logo_y))
-            pygame.display.flip()
+            present_canvas()
             clock.tick(60)
             
             # Check for early exit
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT or (
-                    event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
-                ):
-                    pygame.quit()
-                    return
+            if not process_events():
+                return shutdown()
 
         # Ensure we end on black
         screen.fill((0, 0, 0))
-        pygame.display.flip()
+        present_canvas()
         
         # Small pause on black screen
         time.sleep(0.2)
 
-    except Exception as e:
-        print(f"Error loading logo: {e}")
-        # Fallback to simple loading text
-        font = pygame.font.SysFont(None, 48)
-        loading_text = font.render("Loading...", True, (255, 255, 255))
-        text_rect = loading_text.get_rect(center=(screen_width/2, screen_height/2))
-        screen.fill((0, 0, 0))
-        screen.blit(loading_text, text_rect)
-        pygame.display.flip()
-        
-        # Load images without visual progress
-        images = []
-        for path in image_paths:
-            try:
-                img = load_and_scale_image(path, screen_width, screen_height)
-                if img:
-                    images.append(img)
-            except Exception as e:
-                print(f"Error loading image {path}: {e}")
-
-    if not images:
+    current_index = window.first_index()
+    if current_index is None:
         print("No images were successfully loaded!")
-        pygame.quit()
-        return
+        return shutdown()
 
-    print(f"Successfully loaded {len(images)} images")
-    
-    current_index = 0
-    next_index = 1 if len(images) > 1 else 0
-    last_switch = time.time()
-    is_transitioning = False
-    transition_start = 0
-    running = True
-    display_surface = pygame.Surface((screen_width, screen_height))
-    display_surface.fill((0, 0, 0))
+    print(f"First slide ready, {window.available()} of {len(window.image_paths)} images usable")
+    current_image = window.get(current_index)
+    pending_index = None
+    skip_requested = False
 
     # Initial fade in from black
+    stats.enter('transition')
     fade_start = time.time()
     while time.time() - fade_start < transition_duration:
         progress = (time.time() - fade_start) / transition_duration
-        temp = images[current_index].copy()
-        temp.set_alpha(int(255 * progress))
-        
-        screen.fill((0, 0, 0))
-        screen.blit(temp, (0, 0))
-        pygame.display.flip()
+        renderer.fade_in(current_image, progress)
+        present_frame()
+        stats.frame()
         clock.tick(60)
 
         # Check for early exit
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT or (
-                event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
-            ):
-                pygame.quit()
-                return
+        if not process_events():
+            return shutdown()
 
-    display_surface = images[current_index].copy()
     last_switch = time.time()  # Reset timer after initial fade
+    play(current_index)
+    damaged = True
+    prerender_pending = transition in prerender_transitions
 
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT or (
-                event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
-            ):
-                running = False
-                pygame.quit()
-                return
+    def finish_switch(index, image, switch_time):
+        """Make index the current slide; prefetch the one after it during its dwell"""
+        nonlocal current_index, current_image, last_switch, damaged, prerender_pending, switches
+        switches += 1
+        current_index = index
+        current_image = image
+        window.focus(current_index)
+        play(current_index)
+        last_switch = switch_time
+        damaged = True
+        prerenderer.release()
+        prerender_pending = transition in prerender_transitions
 
+    while running:
         current_time = time.time()
-        elapsed = current_time - last_switch
-
-        # For "none" transition, just switch immediately when delay is reached
-        if transition == "none":
-            if elapsed >= delay:
-                current_index = (current_index + 1) % len(images)
-                last_switch = current_time
-                display_surface = images[current_index].copy()
-        else:
-            # Start transition when delay time is reached
-            if elapsed >= delay and not is_transitioning:
-                is_transitioning = True
-                transition_start = current_time
-                next_index = (current_index + 1) % len(images)
-
-            # Handle transitions
-            if is_transitioning and len(images) > 1:
-                transition_elapsed = current_time - transition_start
-                if transition_elapsed < transition_duration:
-                    progress = transition_elapsed / transition_duration
-                    if transition == "fade":
-                        display_surface = fade_surface(
-                            images[current_index],
-                            images[next_index],
-                            progress
-                        )
-                    elif transition == "fade-black":
-                        display_surface = fade_to_black(
-                            images[current_index],
-                            images[next_index],
-                            progress
-                        )
-                    elif transition.startswith("slide-"):
-                        display_surface = slide_surface(
-                            images[current_index],
-                            images[next_index],
-                            progress,
-                            direction=transition
-                        )
-                    elif transition == "zoom-in":
-                        display_surface = zoom_surface(
-                            images[current_index],
-                            images[next_index],
-                            progress,
-                            zoom_in=True
-                        )
-                    elif transition == "zoom-out":
-                        display_surface = zoom_surface(
-                            images[current_index],
-                            images[next_index],
-                            progress,
-                            zoom_in=False
-                        )
-                    elif transition == "rotate-cw":
-                        display_surface = rotate_surface(
-                            images[current_index],
-                            images[next_index],
-                            progress,
-                            clockwise=True
-                        )
-                    elif transition == "rotate-ccw":
-                        display_surface = rotate_surface(
-                            images[current_index],
-                            images[next_index],
-                            progress,
-                            clockwise=False
-                        )
-                else:
-                    # Transition complete
-                    current_index = next_index
-                    is_transitioning = False
-                    last_switch = current_time
-                    display_surface = images[current_index].copy()
+        waiting_for_slide = False
+
+        # Move on when the delay is up, or straight away when asked to skip
+        due = skip_requested or (not paused and current_time - last_switch >= current_delay())
+        if due and not is_transitioning:
+            if pending_index is not None and window.is_failed(pending_index):
+                pending_index = window.next_index(pending_index)
+            next_index = pending_index if pending_index is not None else window.next_index(current_index)
+            next_image = window.peek(next_index)
+            if next_image is None and window.available() > 0:
+                # Still decoding; SLIDE_LOADED wakes the wait below
+                window.request(next_index)
+                waiting_for_slide = True
+            elif next_image is None or next_image is current_image:
+                skip_requested = False
+                pending_index = None
+                last_switch = current_time  # Nothing to switch to yet
             else:
-                display_surface = images[current_index].copy()
+                skip_requested = False
+                pending_index = None
+                if transition == "none":
+                    finish_switch(next_index, next_image, current_time)
+                else:
+                    is_transitioning = True
+                    transition_start = current_time
+                    if playing:
+                        # Transition away from the frame on screen, not the first one
+                        playing.stop()
+                        current_image = playing.current
+                        playing = None
 
-        screen.fill((0, 0, 0))
-        screen.blit(display_surface, (0, 0))
-        pygame.display.flip()
-        clock.tick(60)
+        if is_transitioning:
+            transition_elapsed = current_time - transition_start
+            if transition_elapsed >= transition_duration:
+                # Transition complete
+                is_transitioning = False
+                finish_switch(next_index, next_image, current_time)
+                if deferred_playlist:
+                    apply_playlist(deferred_playlist)
+
+        if is_transitioning:
+            # Animating: present every frame at up to 60 fps
+            stats.enter('transition')
+            progress = transition_elapsed / transition_duration
+            if not prerenderer.draw(transition, current_image, next_image, progress):
+                renderer.draw(transition, current_image, next_image, progress)
+            present_frame()
+            stats.frame()
+            clock.tick(60)
+            process_events()
+        else:
+            # Static slide: present it once, then sleep until the next slide is due
+            stats.enter('dwell')
+            frame_deadline = None
+            if playing:
+                dropped = playing.dropped
+                frame, frame_wait = playing.frame(current_time - last_switch)
+                animation_dropped += playing.dropped - dropped
+                frame_deadline = current_time + frame_wait
+                if frame is not shown_frame:
+                    renderer.show_frame(frame)
+                    present_frame()
+                    stats.frame()
+                    animation_frames += 1
+                    shown_frame = frame
+                    damaged = False
+            if damaged:
+                renderer.show(current_image)
+                present_frame()
+                stats.frame()
+                damaged = False
+            if prerender_pending:
+                prepare_next_transition()
+            stats.maybe_report()
+            if waiting_for_slide:
+                deadline = current_time + 1.0
+            elif paused:
+                deadline = current_time + 3600
+            else:
+                deadline = last_switch + current_delay()
+            if frame_deadline is not None:
+                deadline = min(deadline, frame_deadline)
+            wait_until(deadline)
 
-    # Show the cursor again before quitting
-    pygame.mouse.set_visible(True)
-    pygame.quit()
+    shutdown()
 
 if __name__ == "__main__":
+    # Optional "--control PATH": listen for commands from app.py on a Unix socket
+    control_socket = None
+    if "--control" in sys.argv:
+        flag = sys.argv.index("--control")
+        control_socket = sys.argv[flag + 1] if len(sys.argv) > flag + 1 else display_control.CONTROL_SOCKET
+        del sys.argv[flag:flag + 2]
+
     if len(sys.argv) > 1:
         image_paths = [path.strip() for path in sys.argv[1].split(',') if path.strip()]
         delay = 10  # default delay
         transition = "fade"  # default transition
         transition_duration = 3.0  # default transition duration
+        lookahead = 1  # default number of slides decoded ahead
+        blend_backend = os.environ.get("PIMENU_BLEND_BACKEND", "sdl")  # default blend backend
+        renderer_name = os.environ.get("PIMENU_RENDERER", "software")  # default renderer
         
         # Debug the image paths and arguments
         print(f"Received image paths: {image_paths}")
@@ -490,11 +1696,7 @@ if __name__ == "__main__":
                 print(f"Invalid delay value: {sys.argv[2]}, using default")
                 
         if len(sys.argv) > 3:  # Transition type
-            valid_transitions = [
-                "fade", "fade-black", "slide-left", "slide-right", "slide-up", "slide-down",
-                "zoom-in", "zoom-out", "rotate-cw", "rotate-ccw", "none"
-            ]
-            if sys.argv[3] in valid_transitions:
+            if sys.argv[3] in VALID_TRANSITIONS:
                 transition = sys.argv[3]
             else:
                 print(f"Invalid transition type: {sys.argv[3]}, using default")
@@ -504,10 +1706,31 @@ if __name__ == "__main__":
                 transition_duration = float(sys.argv[4])
             except ValueError:
                 print(f"Invalid transition duration: {sys.argv[4]}, using default")
+
+        if len(sys.argv) > 5:  # Slides decoded ahead of the current one, or "all"
+            if sys.argv[5] == "all":
+                lookahead = None
+            else:
+                try:
+                    lookahead = max(0, int(sys.argv[5]))
+                except ValueError:
+                    print(f"Invalid lookahead: {sys.argv[5]}, using default")
+
+        if len(sys.argv) > 6:  # Blend backend
+            if sys.argv[6] in BLEND_BACKENDS:
+                blend_backend = sys.argv[6]
+            else:
+                print(f"Invalid blend backend: {sys.argv[6]}, using default")
+
+        if len(sys.argv) > 7:  # Renderer
+            if sys.argv[7] in RENDERERS:
+                renderer_name = sys.argv[7]
+            else:
+                print(f"Invalid renderer: {sys.argv[7]}, using default")
         
         if len(image_paths) < 1:
             print("Error: No valid image paths provided")
             sys.exit(1)
             
-        print(f"Running with: delay={delay}, transition={transition}, transition_duration={transition_duration}")
-        display_slideshow(image_paths, delay, transition, transition_duration) 
\ No newline at end of file
+        print(f"Running with: delay={delay}, transition={transition}, transition_duration={transition_duration}, lookahead={lookahead}, blend_backend={blend_backend}, renderer={renderer_name}")
+        display_slideshow(image_paths, delay, transition, transition_duration, lookahead, blend_backend, control_socket, renderer_name) 
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""Server-sent event fan-out with bounded, coalescing per-client buffers
+
+Every event gets a sequence number, which is sent as the SSE id. A
+reconnecting browser sends it back as Last-Event-ID and receives only what
+it missed. Events of a state type, like the current settings or the image
+order, replace any copy of the same type still waiting for a slow client.
+That client gets only the latest value instead of a backlog. A client that
+falls further behind than its buffer or the history allows gets one
+'resync' event and fetches the state again.
+
+publish() serializes an event once and never blocks on a client.
+"""
+import json
+import uuid
+import threading
+from collections import OrderedDict, deque
+
+HISTORY_SIZE = 256  # Events kept for Last-Event-ID resume
+CLIENT_BUFFER = 64  # Undelivered events per client before it is told to resync
+MAX_CLIENTS = 16  # Concurrent streams; each holds a server thread
+
+class Event:
+    __slots__ = ('seq', 'type', 'key', 'text')
+
+    def __init__(self, epoch, seq, event_type, key, data):
+        self.seq = seq
+        self.type = event_type
+        self.key = key
+        self.text = f"id: {epoch}-{seq}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+class Subscriber:
+    """One client's pending events, oldest first, at most one per coalescing key
+
+    last_id gives the broker's newest event id, sent with 'resync' so the
+    browser resumes from there instead of resyncing again on reconnect.
+    """
+
+    def __init__(self, limit, last_id):
+        self.limit = limit
+        self.last_id = last_id
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.overflowed = False
+        self.closed = False
+
+    def push(self, event):
+        with self.condition:
+            if self.overflowed:
+                return
+            self.pending.pop(event.key, None)  # Last value wins and moves to the back
+            self.pending[event.key] = event
+            if len(self.pending) > self.limit:
+                # Too far behind to catch up event by event
+                self.pending.clear()
+                self.overflowed = True
+            self.condition.notify()
+
+    def get(self, timeout):
+        """Wait up to timeout for events; returns SSE text chunks, empty on timeout"""
+        with self.condition:
+            if not self.pending and not self.overflowed and not self.closed:
+                self.condition.wait(timeout)
+            if self.overflowed:
+                self.overflowed = False
+                return [f"id: {self.last_id()}\nevent: resync\ndata: {{}}\n\n"]
+            chunks = [event.text for event in self.pending.values()]
+            self.pending.clear()
+            return chunks
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+class EventBroker:
+    """Publishes events to every subscriber and keeps a short history for resume
+
+    coalesce maps an event type to a function of its data giving the key
+    under which it replaces older events. Types not listed are never
+    coalesced.
+    """
+
+    def __init__(self, coalesce=None, history_size=HISTORY_SIZE, client_buffer=CLIENT_BUFFER, max_clients=MAX_CLIENTS):
+        self.coalesce = coalesce or {}
+        self.client_buffer = client_buffer
+        self.max_clients = max_clients
+        self.epoch = uuid.uuid4().hex[:8]  # Ids from an earlier server run never match
+        self.seq = 0
+        self.history = deque(maxlen=history_size)
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def publish(self, event_type, data):
+        key_of = self.coalesce.get(event_type)
+        with self.lock:
+            self.seq += 1
+            key = (event_type, key_of(data)) if key_of else self.seq
+            event = Event(self.epoch, self.seq, event_type, key, data)
+            self.history.append(event)
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.push(event)
+        return event.seq
+
+    def last_id(self):
+        """Id of the newest event, for pages to resume from when they open their stream"""
+        with self.lock:
+            return f"{self.epoch}-{self.seq}"
+
+    def parse_id(self, last_event_id):
+        """Sequence number from a Last-Event-ID header, or None if it is not from this run"""
+        epoch, _, seq = (last_event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def subscribe(self, last_event_id=None):
+        """Register a client, replaying what it missed since last_event_id; None if full"""
+        subscriber = Subscriber(self.client_buffer, self.last_id)
+        with self.lock:
+            if len(self.subscribers) >= self.max_clients:
+                return None
+            if last_event_id:
+                seq = self.parse_id(last_event_id)
+                oldest = self.history[0].seq if self.history else self.seq + 1
+                if seq is None or seq > self.seq or seq < oldest - 1:
+                    subscriber.overflowed = True  # Restarted server or too old to replay
+                else:
+                    for event in self.history:
+                        if event.seq > seq:
+                            subscriber.push(event)
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def close(self):
+        """End every open stream, e.g. when the server shuts down"""
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def client_count(self):
+        with self.lock:
+            return len(self.subscribers)
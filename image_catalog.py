@@ -0,0 +1,263 @@
+"""In-memory index of the uploads folder
+
+Holds name, size, ctime, dimensions, content hash and order for every upload
+so request handlers never list the folder or stat files. app.py updates it
+on upload, delete and reorder; a watcher thread resyncs it when files are
+added or removed behind the app's back (e.g. copied in over SSH), using
+inotify when the optional inotify_simple package is installed and a cheap
+directory mtime poll otherwise.
+"""
+import os
+import time
+import threading
+from PIL import Image
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+POLL_INTERVAL = 2.0  # Seconds between directory checks without inotify
+SETTLE_DELAY = 0.5  # Seconds to let a burst of file events finish before resyncing
+
+class ImageCatalog:
+    """Metadata for every upload, loaded once and kept up to date incrementally
+
+    order_loader returns the saved display order and hash_lookup(path) a known
+    content hash or None; both are only called when the catalog first loads.
+
+    Every change bumps version and is reported to listener(kind, version, data)
+    while the lock is held, so listeners see changes in version order:
+    'add' {entry, position}, 'update' {entry}, 'remove' {names}, 'move' {order}.
+    """
+
+    def __init__(self, folder, order_loader=None, hash_lookup=None, listener=None):
+        self.folder = folder
+        self.order_loader = order_loader
+        self.hash_lookup = hash_lookup
+        self.listener = listener
+        self.entries = {}
+        self.order = []
+        self.version = 0
+        self.loaded = False
+        self.lock = threading.RLock()
+
+    def _emit(self, kind, **data):
+        """Record a change; caller holds the lock"""
+        self.version += 1
+        if self.listener:
+            try:
+                self.listener(kind, self.version, data)
+            except Exception as e:
+                print(f"Error reporting catalog {kind}: {e}")
+
+    def _ensure_loaded(self):
+        """Scan the folder the first time the catalog is used; caller holds the lock"""
+        if self.loaded:
+            return
+        self.loaded = True
+        for name in self._scan():
+            self._refresh(name)
+            if self.hash_lookup and name in self.entries:
+                self.entries[name]['hash'] = self.hash_lookup(os.path.join(self.folder, name))
+        saved = self.order_loader() if self.order_loader else []
+        self.order = [name for name in saved if name in self.entries]
+
+    def _scan(self):
+        try:
+            with os.scandir(self.folder) as it:
+                return {entry.name for entry in it if entry.is_file()}
+        except OSError as e:
+            print(f"Error scanning {self.folder}: {e}")
+            return set()
+
+    def _refresh(self, name):
+        """(Re)read one file's metadata; returns False if it is gone"""
+        path = os.path.join(self.folder, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.entries.pop(name, None)
+            return False
+        entry = self.entries.get(name)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return True
+        width = height = None
+        try:
+            with Image.open(path) as img:  # Reads the header only
+                width, height = img.size
+        except Exception:
+            pass  # Still being written, or not an image
+        self.entries[name] = {
+            'name': name,
+            'size': stat.st_size,
+            'ctime': stat.st_ctime,
+            'mtime_ns': stat.st_mtime_ns,
+            'width': width,
+            'height': height,
+            'hash': None,
+        }
+        return True
+
+    def _ordered_names(self):
+        """Display order: the saved order first, then the rest by name; caller holds the lock"""
+        listed = set(self.order)
+        return [name for name in self.order if name in self.entries] + \
+            [name for name in sorted(self.entries) if name not in listed]
+
+    def images(self):
+        """Entries in display order"""
+        return self.snapshot()[1]
+
+    def snapshot(self):
+        """(version, entries in display order) taken atomically"""
+        with self.lock:
+            self._ensure_loaded()
+            return self.version, [dict(self.entries[name], position=i)
+                                  for i, name in enumerate(self._ordered_names())]
+
+    def get(self, name):
+        with self.lock:
+            self._ensure_loaded()
+            entry = self.entries.get(name)
+            return dict(entry) if entry else None
+
+    def __len__(self):
+        with self.lock:
+            self._ensure_loaded()
+            return len(self.entries)
+
+    def __contains__(self, name):
+        with self.lock:
+            self._ensure_loaded()
+            return name in self.entries
+
+    def names(self):
+        """Upload names in display order"""
+        return [entry['name'] for entry in self.images()]
+
+    def add(self, name, content_hash=None):
+        """Record a new or rewritten upload, append it to the order and return the order"""
+        with self.lock:
+            self._ensure_loaded()
+            known = name in self.entries
+            if self._refresh(name):
+                self.entries[name]['hash'] = content_hash
+                if name not in self.order:
+                    self.order.append(name)
+                if known:
+                    self._emit('update', entry=dict(self.entries[name]))
+                else:
+                    self._emit('add', entry=dict(self.entries[name]), position=self._ordered_names().index(name))
+            return list(self.order)
+
+    def remove(self, names):
+        """Forget uploads and return the order without them"""
+        with self.lock:
+            self._ensure_loaded()
+            removed = [name for name in names if self.entries.pop(name, None)]
+            self.order = [name for name in self.order if name not in set(names)]
+            if removed:
+                self._emit('remove', names=removed)
+            return list(self.order)
+
+    def reorder(self, order):
+        with self.lock:
+            self._ensure_loaded()
+            before = self._ordered_names()
+            self.order = [name for name in order if name in self.entries]
+            after = self._ordered_names()
+            if after != before:
+                self._emit('move', order=after)
+            return list(self.order)
+
+    def refresh(self, name):
+        """Re-read a file's metadata after it was replaced, keeping its hash and position"""
+        with self.lock:
+            self._ensure_loaded()
+            entry = self.entries.get(name)
+            if entry is None:
+                return
+            if self._refresh(name) and self.entries[name] is not entry:
+                self.entries[name]['hash'] = entry['hash']
+                self._emit('update', entry=dict(self.entries[name]))
+
+    def names_with_hash(self, content_hash):
+        with self.lock:
+            self._ensure_loaded()
+            return [name for name, entry in self.entries.items() if entry['hash'] == content_hash]
+
+    def set_hash(self, name, content_hash):
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry and entry['hash'] != content_hash:
+                entry['hash'] = content_hash
+                self._emit('update', entry=dict(entry))
+
+    def resync(self):
+        """Reconcile with the folder; returns (added, removed) name lists"""
+        with self.lock:
+            self._ensure_loaded()
+            names = self._scan()
+            removed = sorted(set(self.entries) - names)
+            for name in removed:
+                del self.entries[name]
+            self.order = [name for name in self.order if name in self.entries]
+            if removed:
+                self._emit('remove', names=removed)
+
+            added = []
+            for name in sorted(names):
+                known = name in self.entries
+                old = self.entries.get(name)
+                if not self._refresh(name):
+                    continue
+                if not known:
+                    added.append(name)
+                    self.order.append(name)
+                    self._emit('add', entry=dict(self.entries[name]), position=self._ordered_names().index(name))
+                elif self.entries[name] is not old:
+                    added.append(name)  # Rewritten in place
+                    self._emit('update', entry=dict(self.entries[name]))
+            return added, removed
+
+    def watch(self, on_change):
+        """Resync in a background thread when the folder changes; on_change(added, removed)"""
+        target = self._watch_inotify if inotify_simple else self._watch_poll
+        threading.Thread(target=target, args=(on_change,), daemon=True).start()
+
+    def _resync_and_notify(self, on_change):
+        try:
+            added, removed = self.resync()
+            if added or removed:
+                on_change(added, removed)
+        except Exception as e:
+            print(f"Error resyncing {self.folder}: {e}")
+
+    def _watch_poll(self, on_change):
+        last_mtime = None
+        while True:
+            try:
+                mtime = os.stat(self.folder).st_mtime_ns
+            except OSError:
+                mtime = None
+            if last_mtime is not None and mtime != last_mtime:
+                time.sleep(SETTLE_DELAY)
+                self._resync_and_notify(on_change)
+            last_mtime = mtime
+            time.sleep(POLL_INTERVAL)
+
+    def _watch_inotify(self, on_change):
+        flags = inotify_simple.flags
+        try:
+            inotify = inotify_simple.INotify()
+            inotify.add_watch(self.folder, flags.CLOSE_WRITE | flags.DELETE | flags.MOVED_TO | flags.MOVED_FROM)
+        except OSError as e:
+            print(f"inotify unavailable ({e}), polling {self.folder} instead")
+            return self._watch_poll(on_change)
+        while True:
+            if inotify.read():
+                # Swallow the rest of a burst, then resync once
+                while inotify.read(timeout=int(SETTLE_DELAY * 1000)):
+                    pass
+                self._resync_and_notify(on_change)
@@ -0,0 +1,183 @@
+"""Pre-scaled display renders shared by app.py and display_image.py
+
+A render is an image already letterboxed to a panel size and stored as raw
+RGB bytes named <content hash>_<width>x<height>.rgb, so the slideshow can wrap
+it with pygame.image.frombuffer instead of decoding and scaling the original.
+app.py maintains a manifest mapping upload names to content hashes and
+display_image.py records the panel sizes it runs at.
+"""
+import os
+import json
+import time
+from threading import Lock
+from PIL import Image
+
+RENDER_FOLDER = os.path.join('cache', 'renders')
+MANIFEST_FILE = os.path.join(RENDER_FOLDER, 'manifest.json')
+DISPLAYS_FILE = os.path.join(RENDER_FOLDER, 'displays.json')
+MAX_DISPLAY_SIZES = 3  # Most recent panel sizes kept warm
+MAX_RENDER_BYTES = 768 * 1024 * 1024  # Renders kept on disk; 49 uploads at 1080p take about 300 MB
+ORPHAN_GRACE = 60  # Seconds a render may exist before its upload is in the manifest
+
+manifest_lock = Lock()
+
+def render_key(content_hash, size):
+    return f"{content_hash}_{size[0]}x{size[1]}.rgb"
+
+def render_path(content_hash, size):
+    return os.path.join(RENDER_FOLDER, render_key(content_hash, size))
+
+def write_atomic(path, data):
+    """Write bytes via a temp file and rename so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def fit_size(image_size, size):
+    """Largest size with the image's aspect ratio that fits inside size"""
+    screen_width, screen_height = size
+    aspect_ratio = image_size[0] / image_size[1]
+    if screen_width / screen_height > aspect_ratio:
+        return int(screen_height * aspect_ratio), screen_height
+    return screen_width, int(screen_width / aspect_ratio)
+
+def flatten_to_rgb(img):
+    """Return an RGB version of an image, compositing any transparency onto black
+
+    Palette and greyscale images mark transparency with a 'transparency'
+    entry rather than an alpha band, so they are expanded to RGBA first;
+    otherwise the transparent index would show in its palette colour.
+    """
+    if img.mode in ('RGBA', 'LA', 'PA', 'RGBa', 'La') or 'transparency' in img.info:
+        rgba = img.convert('RGBA')
+        img = Image.new('RGB', img.size, 'black')
+        img.paste(rgba, mask=rgba.getchannel('A'))
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    # Remove problematic profiles
+    img.info.pop('icc_profile', None)
+    return img
+
+def letterbox(img, size):
+    """Raw RGB bytes of an image scaled to fit size and centred on black: a render
+
+    Pillow releases the GIL while it decodes and resizes, so several threads
+    can letterbox images at once. Transparency is composited onto black.
+    """
+    new_size = fit_size(img.size, size)
+    img.draft('RGB', new_size)  # JPEGs much larger than the panel decode at a reduced scale
+    img = flatten_to_rgb(img)
+    scaled = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    if new_size == tuple(size):
+        return scaled.tobytes()
+    canvas = Image.new('RGB', size, 'black')
+    canvas.paste(scaled, ((size[0] - new_size[0]) // 2, (size[1] - new_size[1]) // 2))
+    return canvas.tobytes()
+
+def load_json(path, default):
+    try:
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"Error loading {path}: {e}")
+    return default
+
+def file_signature(file_path):
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def update_manifest(entries=None, removed=()):
+    """Add or replace manifest entries ({name: {'hash', 'size', 'mtime_ns'}}) and drop removed names
+
+    The file is only rewritten when its contents change.
+    """
+    with manifest_lock:
+        current = load_json(MANIFEST_FILE, {})
+        manifest = dict(current, **(entries or {}))
+        for name in removed:
+            manifest.pop(name, None)
+        if manifest == current:
+            return
+        try:
+            write_atomic(MANIFEST_FILE, json.dumps(manifest).encode())
+        except OSError as e:
+            print(f"Error saving render manifest: {e}")
+
+def lookup_hash(image_path, manifest=None):
+    """Return the content hash recorded for an upload, or None if unknown or stale"""
+    if manifest is None:
+        manifest = load_json(MANIFEST_FILE, {})
+    entry = manifest.get(os.path.basename(image_path))
+    if not entry:
+        return None
+    try:
+        signature = file_signature(image_path)
+    except OSError:
+        return None
+    if signature['size'] != entry.get('size') or signature['mtime_ns'] != entry.get('mtime_ns'):
+        return None
+    return entry.get('hash')
+
+def discard_renders(content_hash):
+    try:
+        for name in os.listdir(RENDER_FOLDER):
+            if name.startswith(content_hash):
+                os.remove(os.path.join(RENDER_FOLDER, name))
+    except OSError as e:
+        print(f"Error discarding renders for {content_hash}: {e}")
+
+def prune_renders(sizes, max_bytes=MAX_RENDER_BYTES):
+    """Delete renders nothing will read, then the least useful ones until under max_bytes
+
+    A render is unused once its size is not in sizes (the panel sizes in
+    use, newest first) or its hash is not in the manifest. Over the cap,
+    renders for older panel sizes go first, then the least recently written.
+    """
+    sizes = [tuple(size) for size in sizes]
+    hashes = {entry.get('hash') for entry in load_json(MANIFEST_FILE, {}).values()}
+    now = time.time()
+    kept = []
+    total = 0
+    try:
+        with os.scandir(RENDER_FOLDER) as it:
+            for entry in it:
+                content_hash, _, dimensions = entry.name[:-len('.rgb')].rpartition('_')
+                if not entry.name.endswith('.rgb') or not content_hash:
+                    continue
+                try:
+                    size = tuple(int(n) for n in dimensions.split('x'))
+                    stat = entry.stat()
+                except (ValueError, OSError):
+                    continue
+                if size not in sizes or (content_hash not in hashes and now - stat.st_mtime > ORPHAN_GRACE):
+                    os.remove(entry.path)
+                    continue
+                kept.append((-sizes.index(size), stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, _, file_size, path in sorted(kept):
+            if total <= max_bytes:
+                break
+            os.remove(path)
+            total -= file_size
+    except OSError as e:
+        print(f"Error pruning renders: {e}")
+
+def record_display_size(size):
+    """Remember a panel size so app.py pre-renders uploads for it"""
+    sizes = [tuple(s) for s in load_json(DISPLAYS_FILE, [])]
+    size = tuple(size)
+    if sizes and sizes[0] == size:
+        return
+    sizes = [size] + [s for s in sizes if s != size]
+    try:
+        write_atomic(DISPLAYS_FILE, json.dumps(sizes[:MAX_DISPLAY_SIZES]).encode())
+    except OSError as e:
+        print(f"Error saving display sizes: {e}")
+
+def known_display_sizes(default):
+    sizes = [tuple(s) for s in load_json(DISPLAYS_FILE, [])]
+    return sizes or [tuple(default)]
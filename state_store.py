@@ -0,0 +1,105 @@
+"""Write-behind cache for app.py's small JSON state files
+
+Each file is read from disk once and then served from memory. Saves update
+the cached value straight away and are written out by a background thread
+after FLUSH_DELAY, so a burst of changes (dragging images around, toggling
+a selection) costs one write. A save that does not change the value costs
+nothing. Writes go to a temp file that is fsynced and renamed over the
+original, so a power cut leaves either the old or the new state, never a
+torn file. Pending writes are flushed at exit.
+"""
+import os
+import json
+import time
+import atexit
+import threading
+
+FLUSH_DELAY = 1.0  # Seconds to coalesce saves before writing
+
+def write_durable(path, text):
+    """Atomically replace path with text, fsyncing the file and its directory"""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Directory fsync is best effort
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class StateStore:
+    """In-memory JSON documents keyed by file path, persisted in the background"""
+
+    def __init__(self, flush_delay=FLUSH_DELAY):
+        self.flush_delay = flush_delay
+        self.cache = {}  # path -> serialized JSON, or None when the file is missing
+        self.dirty = set()
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()  # One flush at a time, so the newest text lands last
+        self.thread = None
+        atexit.register(self.flush)
+
+    def _read(self, path):
+        """Serialized document for path, read from disk on first use; caller holds the condition"""
+        if path not in self.cache:
+            text = None
+            try:
+                if os.path.exists(path):
+                    with open(path, 'r') as f:
+                        text = json.dumps(json.load(f))
+            except Exception as e:
+                print(f"Error loading {path}: {e}")
+            self.cache[path] = text
+        return self.cache[path]
+
+    def load(self, path, default):
+        """Return a fresh copy of the document at path, or default if there is none"""
+        with self.condition:
+            text = self._read(path)
+        return default if text is None else json.loads(text)
+
+    def save(self, path, value):
+        """Replace the document at path; written to disk within flush_delay"""
+        try:
+            text = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            print(f"Error saving {path}: {e}")
+            return False
+        with self.condition:
+            if self._read(path) == text:
+                return True  # Unchanged, nothing to write
+            self.cache[path] = text
+            self.dirty.add(path)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+        return True
+
+    def _flush_loop(self):
+        while True:
+            with self.condition:
+                while not self.dirty:
+                    self.condition.wait()
+            # Let further saves pile up, then write them all at once
+            time.sleep(self.flush_delay)
+            self.flush()
+
+    def flush(self):
+        """Write every pending document now"""
+        with self.write_lock:
+            with self.condition:
+                pending = {path: self.cache[path] for path in self.dirty}
+                self.dirty.clear()
+            for path, text in pending.items():
+                try:
+                    write_durable(path, text)
+                except OSError as e:
+                    print(f"Error writing {path}: {e}")
@@ -0,0 +1,196 @@
+"""Chunked, resumable uploads that are hashed and validated as bytes arrive
+
+A client opens a session with the file name and size, then sends the body
+in order in one or more chunks, each tagged with its byte offset. A chunk
+at the wrong offset is refused with the offset the server has, so an
+interrupted upload resumes from there instead of starting over. The first
+bytes are checked against the image signatures below. The SHA-256 is
+computed incrementally, so a finished upload is never read back just to
+hash it.
+"""
+import os
+import time
+import uuid
+import hashlib
+from threading import Lock
+
+INCOMING_FOLDER = os.path.join('cache', 'incoming')
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024  # Largest file accepted
+CHUNK_SIZE = 1024 * 1024  # Chunk size suggested to clients
+SESSION_TIMEOUT = 3600  # Seconds before an abandoned upload is discarded
+MAX_SESSIONS = 8  # Uploads in progress at once
+MAX_PENDING_BYTES = 200 * 1024 * 1024  # Announced size of all uploads in progress
+SNIFF_BYTES = 32  # Bytes needed to recognise every supported format
+
+EXTENSIONS = {
+    'jpeg': ('.jpg', '.jpeg'),
+    'png': ('.png',),
+    'gif': ('.gif',),
+    'bmp': ('.bmp',),
+    'webp': ('.webp',),
+    'heif': ('.heic', '.heif'),
+}
+HEIF_BRANDS = {b'heic', b'heix', b'hevc', b'hevx', b'heim', b'heis', b'hevm', b'hevs', b'mif1', b'msf1'}
+
+class UploadError(Exception):
+    """Rejected upload; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+def allowed_extensions():
+    return tuple(ext for exts in EXTENSIONS.values() for ext in exts)
+
+def sniff_image_type(header):
+    """Return the format key for the magic bytes at the start of a file, or None"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if header.startswith(b'BM'):
+        return 'bmp'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    if header[4:8] == b'ftyp' and header[8:12] in HEIF_BRANDS:
+        return 'heif'
+    return None
+
+class UploadSession:
+    def __init__(self, filename, size):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.size = size
+        self.received = 0
+        self.header = b''
+        self.kind = None
+        self.sha = hashlib.sha256()
+        self.path = os.path.join(INCOMING_FOLDER, f"{self.id}.part")
+        self.updated = time.time()
+        self.lock = Lock()  # Chunks of one upload are written one at a time
+
+    @property
+    def complete(self):
+        return self.received == self.size
+
+    @property
+    def digest(self):
+        return self.sha.hexdigest()
+
+    def state(self):
+        return {'id': self.id, 'offset': self.received, 'size': self.size}
+
+class UploadManager:
+    """Open upload sessions, keyed by id
+
+    At most max_sessions uploads are open at once, and their announced sizes
+    add up to at most max_pending_bytes, so clients cannot fill the card
+    with partial files that are only reaped after SESSION_TIMEOUT.
+    """
+
+    def __init__(self, max_bytes=MAX_UPLOAD_BYTES, max_sessions=MAX_SESSIONS, max_pending_bytes=MAX_PENDING_BYTES):
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.max_pending_bytes = max_pending_bytes
+        self.sessions = {}
+        self.lock = Lock()
+        os.makedirs(INCOMING_FOLDER, exist_ok=True)
+        # Sessions live in memory, so parts left by a previous run can never be resumed
+        for name in os.listdir(INCOMING_FOLDER):
+            try:
+                os.remove(os.path.join(INCOMING_FOLDER, name))
+            except OSError:
+                pass
+
+    def start(self, filename, size, extensions):
+        """Open a session for a file of size bytes whose name ends in one of extensions"""
+        self.expire()
+        if not filename.lower().endswith(extensions):
+            raise UploadError('Invalid file type')
+        if size <= 0:
+            raise UploadError('Empty file')
+        if size > self.max_bytes:
+            raise UploadError(f'File exceeds {self.max_bytes // (1024 * 1024)}MB limit', 413)
+        session = UploadSession(filename, size)
+        with self.lock:
+            if len(self.sessions) >= self.max_sessions:
+                raise UploadError('Too many uploads in progress, try again shortly', 429)
+            if sum(s.size for s in self.sessions.values()) + size > self.max_pending_bytes:
+                raise UploadError('Not enough room for another upload right now, try again shortly', 507)
+            self.sessions[session.id] = session
+        try:
+            open(session.path, 'wb').close()
+        except OSError:
+            self.discard(session.id)
+            raise
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            raise UploadError('Unknown upload', 404)
+        return session
+
+    def write(self, session_id, offset, stream, block_size=64 * 1024):
+        """Append a chunk read from stream at offset; returns the session"""
+        session = self.get(session_id)
+        with session.lock:
+            if offset != session.received:
+                raise UploadError('Wrong offset', 409, session.received)
+            with open(session.path, 'r+b') as f:
+                f.seek(offset)
+                f.truncate()  # Drop any tail left by a chunk that broke off mid-way
+                received = session.received
+                sha = session.sha.copy()
+                header = session.header
+                while True:
+                    block = stream.read(block_size)
+                    if not block:
+                        break
+                    received += len(block)
+                    if received > session.size:
+                        self.discard(session_id)
+                        raise UploadError('More data than announced', 413)
+                    if len(header) < SNIFF_BYTES:
+                        header += block[:SNIFF_BYTES - len(header)]
+                        if len(header) >= min(SNIFF_BYTES, session.size) and sniff_image_type(header) is None:
+                            self.discard(session_id)
+                            raise UploadError('Not a supported image')
+                    sha.update(block)
+                    f.write(block)
+            # Only commit progress once the whole chunk is on disk
+            session.received = received
+            session.sha = sha
+            session.header = header
+            session.kind = sniff_image_type(header)
+            session.updated = time.time()
+        return session
+
+    def discard(self, session_id):
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session:
+            try:
+                os.remove(session.path)
+            except OSError:
+                pass
+
+    def finish(self, session_id):
+        """Close a completed session and hand back its temp file; caller moves or removes it"""
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            raise UploadError('Unknown upload', 404)
+        return session
+
+    def expire(self):
+        """Drop sessions nobody has written to for SESSION_TIMEOUT"""
+        cutoff = time.time() - SESSION_TIMEOUT
+        with self.lock:
+            stale = [sid for sid, session in self.sessions.items() if session.updated < cutoff]
+        for session_id in stale:
+            self.discard(session_id)